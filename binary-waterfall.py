@@ -1,4 +1,8 @@
+import multiprocessing
+
 from src import binary_waterfall
 
 if __name__ == "__main__":
+    # Needed for the export worker processes in frozen builds
+    multiprocessing.freeze_support()
     binary_waterfall.run()
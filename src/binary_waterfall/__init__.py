@@ -1 +1,4 @@
-from .core import run
+# The GUI is only imported when it is run, so the rest of the package works without Qt
+def run():
+    from .core import run as run_gui
+    run_gui()
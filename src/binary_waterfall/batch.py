@@ -0,0 +1,414 @@
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+import concurrent.futures
+import concurrent.futures.process
+
+from . import constants, generators, renderers
+
+
+# A real boolean, or "true" / "false" (bool() would make any non-empty string True)
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+
+    if isinstance(value, str) and value.strip().lower() in ["true", "false"]:
+        return value.strip().lower() == "true"
+
+    raise ValueError("must be true or false")
+
+
+# BinaryWaterfall settings a job can set, with how to convert them from the manifest
+JOB_SETTINGS = {
+    "width": int,
+    "height": int,
+    "color_format": str,
+    "flip_v": parse_bool,
+    "flip_h": parse_bool,
+    "alignment": lambda value: constants.AlignmentCode[str(value).upper()],
+    "playhead_visible": parse_bool,
+    "num_channels": int,
+    "sample_bytes": int,
+    "sample_rate": int,
+    "volume": int
+}
+
+# The options each output type takes (besides "type" and "filename"), and their defaults
+OUTPUT_OPTIONS = {
+    "audio": {},
+    "image": {
+        "ms": 0,
+        "size": None,
+        "keep_aspect": False
+    },
+    "sequence": {
+        "fps": 60.0,
+        "size": None,
+        "keep_aspect": False,
+        "format": constants.ImageFormatCode.PNG.value.lstrip("."),
+        "workers": 1
+    },
+    "video": {
+        "fps": 60.0,
+        "size": None,
+        "keep_aspect": False,
+        "codec": None,
+        "audio_codec": constants.AudioCodecCode.MP3.value,
+        "preset": constants.EncoderPresetCode.ULTRAFAST.value,
+        "bitrate": None,
+        "audio_bitrate": None,
+        "segments": 1,
+        "segment_threads": None
+    }
+}
+
+
+# Load a manifest file (YAML, or JSON, which YAML also reads)
+#   A manifest is either a list of jobs, or a mapping with a "jobs" list and optional
+#   "defaults" (settings shared by every job) and "retries"
+def load_manifest(filename):
+    import yaml
+
+    with open(filename, "r") as f:
+        manifest = yaml.safe_load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError("A manifest must be a list of jobs, or a mapping with a \"jobs\" list")
+
+    return manifest
+
+
+# Check a job and fill in its defaults, relative paths are resolved against base_dir
+def normalize_job(job, defaults, base_dir):
+    if not isinstance(job, dict):
+        raise ValueError("Each job must be a mapping")
+
+    if "input" not in job:
+        raise ValueError("Each job needs an \"input\" file")
+
+    result = dict()
+    result["input"] = os.path.join(base_dir, job["input"])
+
+    settings = dict(defaults)
+    settings.update(job.get("settings", dict()))
+    result["settings"] = dict()
+    for key, value in settings.items():
+        if key not in JOB_SETTINGS:
+            raise ValueError(f"Unknown setting \"{key}\" for \"{job['input']}\"")
+        try:
+            result["settings"][key] = JOB_SETTINGS[key](value)
+        except (ValueError, TypeError, KeyError):
+            raise ValueError(f"Invalid value {value!r} for setting \"{key}\" for \"{job['input']}\"")
+
+    outputs = job.get("outputs", list())
+    if not isinstance(outputs, list) or len(outputs) == 0:
+        raise ValueError(f"No outputs for \"{job['input']}\"")
+
+    result["outputs"] = list()
+    for output in outputs:
+        if not isinstance(output, dict) or output.get("type") not in OUTPUT_OPTIONS:
+            raise ValueError(f"Outputs for \"{job['input']}\" need a type of {', '.join(OUTPUT_OPTIONS)}")
+
+        if "filename" not in output:
+            raise ValueError(f"An output for \"{job['input']}\" has no \"filename\"")
+
+        options = OUTPUT_OPTIONS[output["type"]]
+        for key in output:
+            if key not in options and key not in ["type", "filename"]:
+                raise ValueError(f"Unknown {output['type']} output option \"{key}\" for \"{job['input']}\"")
+
+        normalized = dict(options)
+        normalized.update(output)
+        normalized["filename"] = os.path.join(base_dir, output["filename"])
+        if normalized.get("size") is not None:
+            normalized["size"] = tuple(int(x) for x in normalized["size"])
+        result["outputs"].append(normalized)
+
+    return result
+
+
+def get_jobs(manifest, base_dir):
+    defaults = manifest.get("defaults", dict())
+
+    return [normalize_job(job, defaults, base_dir) for job in manifest["jobs"]]
+
+
+def render_output(renderer, output):
+    size = output.get("size")
+    if size is None and output["type"] != "audio":
+        size = renderer.get_default_export_size()
+
+    if output["type"] == "audio":
+        renderer.export_audio(output["filename"])
+    elif output["type"] == "image":
+        renderer.export_frame(
+            ms=output["ms"],
+            filename=output["filename"],
+            size=size,
+            keep_aspect=output["keep_aspect"]
+        )
+    elif output["type"] == "sequence":
+        renderer.export_sequence(
+            directory=output["filename"],
+            fps=output["fps"],
+            size=size,
+            keep_aspect=output["keep_aspect"],
+            image_format=constants.ImageFormatCode(f".{output['format'].lstrip('.')}"),
+            workers=output["workers"]
+        )
+    elif output["type"] == "video":
+        codec = output["codec"]
+        if codec is None:
+            codec = renderer.get_default_video_codec(output["filename"]).value
+
+        renderer.export_video(
+            filename=output["filename"],
+            fps=output["fps"],
+            size=size,
+            keep_aspect=output["keep_aspect"],
+            codec=codec,
+            audio_codec=output["audio_codec"],
+            bitrate=output["bitrate"],
+            audio_bitrate=output["audio_bitrate"],
+            preset=output["preset"],
+            segments=output["segments"],
+            segment_threads=output["segment_threads"]
+        )
+
+
+# Run one job (used by worker processes)
+#   Never raises, errors are reported in the returned result
+def run_job(job):
+    result = dict()
+    result["input"] = job["input"]
+    result["outputs"] = list()
+    result["error"] = None
+
+    start_time = time.perf_counter()
+    try:
+        settings = dict(job["settings"])
+        if "color_format" in settings:
+            settings["color_format_string"] = settings.pop("color_format")
+        if "volume" in settings and not 0 <= settings["volume"] <= 100:
+            raise ValueError("Volume must be from 0 to 100")
+
+        bw = generators.BinaryWaterfall(filename=job["input"], **settings)
+        try:
+            renderer = renderers.Renderer(binary_waterfall=bw)
+
+            for output in job["outputs"]:
+                output_start_time = time.perf_counter()
+                render_output(renderer, output)
+                result["outputs"].append({
+                    "type": output["type"],
+                    "filename": output["filename"],
+                    "seconds": time.perf_counter() - output_start_time
+                })
+        finally:
+            bw.cleanup()
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+
+    result["status"] = "failed" if result["error"] is not None else "ok"
+    result["seconds"] = time.perf_counter() - start_time
+
+    return result
+
+
+# Batch runner class
+#   Runs a list of jobs on a bounded pool of worker processes (which are
+#   reused between jobs), retrying failed jobs, and collects the results
+class BatchRunner:
+    def __init__(self,
+                 jobs,
+                 workers=constants.DEFAULTS["export_workers"],
+                 retries=1,
+                 log_stream=sys.stderr
+                 ):
+        if workers < 1:
+            raise ValueError("Must use at least 1 worker")
+
+        if retries < 0:
+            raise ValueError("Retries can't be negative")
+
+        self.jobs = jobs
+        self.workers = workers
+        self.retries = retries
+        self.log_stream = log_stream
+
+        self.results = [None] * len(self.jobs)
+        self.executor = None
+
+    def log(self, message):
+        if self.log_stream is not None:
+            self.log_stream.write(f"{message}\n")
+            self.log_stream.flush()
+
+    def make_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(self.workers, max(len(self.jobs), 1)),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def get_failed_result(self, idx, error):
+        result = dict()
+        result["input"] = self.jobs[idx]["input"]
+        result["outputs"] = list()
+        result["error"] = error
+        result["status"] = "failed"
+        result["seconds"] = 0.0
+
+        return result
+
+    def run(self):
+        start_time = time.perf_counter()
+
+        # (job index, attempt number) of the jobs waiting to be submitted
+        pending = [(idx, 1) for idx in range(len(self.jobs))]
+        # Jobs that were running when a worker died, they run again one at a time so we find out which one it was
+        isolated = list()
+        # Future -> (job index, attempt number, whether it's running alone)
+        futures = dict()
+
+        self.executor = self.make_executor()
+        try:
+            while len(pending) > 0 or len(isolated) > 0 or len(futures) > 0:
+                if len(isolated) > 0:
+                    # Nothing else runs with a job that's running alone
+                    if len(futures) == 0:
+                        idx, attempt = isolated.pop(0)
+                        futures[self.executor.submit(run_job, self.jobs[idx])] = (idx, attempt, True)
+                else:
+                    for idx, attempt in pending:
+                        futures[self.executor.submit(run_job, self.jobs[idx])] = (idx, attempt, False)
+                    pending = list()
+
+                done, not_done = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                pool_broken = False
+                lost = list()
+                for future in done:
+                    idx, attempt, alone = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except concurrent.futures.process.BrokenProcessPool as e:
+                        # A worker died outright (not a Python error)
+                        pool_broken = True
+                        if not alone:
+                            # Any of the running jobs could have done it, so this doesn't count as an attempt
+                            lost.append((idx, attempt))
+                            continue
+                        result = self.get_failed_result(idx, f"{type(e).__name__}: {e}")
+                    result["attempts"] = attempt
+
+                    if result["status"] != "ok" and attempt <= self.retries:
+                        self.log(f"[retry {attempt}/{self.retries}] {result['input']}: {result['error']}")
+                        if alone:
+                            isolated.append((idx, attempt + 1))
+                        else:
+                            pending.append((idx, attempt + 1))
+                        continue
+
+                    self.results[idx] = result
+                    done_count = sum(x is not None for x in self.results)
+                    message = f"[{done_count}/{len(self.jobs)}] {result['status']} {result['input']} " \
+                              f"({result['seconds']:.2f}s)"
+                    if result["error"] is not None:
+                        message += f": {result['error']}"
+                    self.log(message)
+
+                if pool_broken:
+                    # The other jobs on the dead pool are lost too (without it being their fault),
+                    # run them again alone on a new pool
+                    lost += [(idx, attempt) for idx, attempt, alone in futures.values()]
+                    futures = dict()
+                    if len(lost) > 0:
+                        self.log(f"A worker died, running the {len(lost)} job(s) it could have been one at a time")
+                    isolated += lost
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self.make_executor()
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+        return self.get_summary(time.perf_counter() - start_time)
+
+    def get_summary(self, seconds):
+        result = dict()
+        result["jobs"] = len(self.results)
+        result["succeeded"] = sum(x["status"] == "ok" for x in self.results)
+        result["failed"] = result["jobs"] - result["succeeded"]
+        result["workers"] = self.workers
+        result["retries"] = self.retries
+        result["seconds"] = seconds
+        result["results"] = self.results
+
+        return result
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="binary-waterfall-batch",
+        description=f"{constants.TITLE} batch renderer, renders every job in a YAML or JSON manifest"
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {constants.VERSION}")
+    parser.add_argument("manifest", help="manifest file (YAML or JSON)")
+    parser.add_argument("-w", "--workers", type=int, default=constants.DEFAULTS["export_workers"],
+                        help="jobs to run at once (default: %(default)s)")
+    parser.add_argument("-r", "--retries", type=int, default=None,
+                        help="times to retry a failed job (default: the manifest's \"retries\", or 1)")
+    parser.add_argument("-s", "--summary", default=None,
+                        help="where to write the JSON result summary (default: next to the manifest)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print progress")
+
+    return parser
+
+
+def main(args):
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    try:
+        manifest = load_manifest(args.manifest)
+        jobs = get_jobs(manifest, base_dir=os.path.dirname(os.path.realpath(args.manifest)))
+
+        retries = args.retries
+        if retries is None:
+            retries = int(manifest.get("retries", 1))
+
+        runner = BatchRunner(
+            jobs=jobs,
+            workers=args.workers,
+            retries=retries,
+            log_stream=None if args.quiet else sys.stderr
+        )
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+
+    summary = runner.run()
+
+    summary_filename = args.summary
+    if summary_filename is None:
+        manifest_main, manifest_ext = os.path.splitext(args.manifest)
+        summary_filename = f"{manifest_main}.summary.json"
+
+    with open(summary_filename, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    if not args.quiet:
+        sys.stderr.write(f"{summary['succeeded']}/{summary['jobs']} jobs succeeded in {summary['seconds']:.2f}s, "
+                         f"summary written to {summary_filename}\n")
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+def run():
+    sys.exit(main(sys.argv[1:]))
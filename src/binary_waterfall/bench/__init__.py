@@ -0,0 +1,5 @@
+from .inputs import parse_size, format_size, make_input
+from .stats import Timer, get_peak_rss_mb
+from .cases import PROFILES, BENCHMARKS, get_cases, run_case
+from .compare import compare_results, format_comparison
+from .cli import run_benchmarks, main, run
@@ -0,0 +1,5 @@
+from .cli import run
+
+# Guarded, the benchmark worker processes import this module again
+if __name__ == "__main__":
+    run()
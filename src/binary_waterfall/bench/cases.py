@@ -0,0 +1,291 @@
+import os
+import sys
+import math
+import contextlib
+import tempfile
+import numpy as np
+
+from .. import constants, generators, renderers
+from . import inputs, stats
+
+# The benchmark matrix for each profile
+#   Frame benchmarks run for every input size, dimension, color format and playhead setting,
+#   the audio and export benchmarks run once per input size at the default settings
+PROFILES = {
+    "quick": {
+        "sizes": ["1MB", "16MB"],
+        "dims": [(48, 48), (256, 256)],
+        "color_formats": ["bgrx", "rgb", "w"],
+        "playheads": [True, False],
+        "frames": 200,
+        "warmup_frames": 10,
+        "audio_repeats": 3,
+        "audio_length_calls": 10000,
+        "export_frames": 20,
+        "video_seconds": 2
+    },
+    "full": {
+        "sizes": ["1MB", "64MB", "1GB", "4GB"],
+        "dims": [(48, 48), (128, 128), (512, 512)],
+        "color_formats": ["bgrx", "rgb", "rgbx", "w", "W"],
+        "playheads": [True, False],
+        "frames": 1000,
+        "warmup_frames": 20,
+        "audio_repeats": 3,
+        "audio_length_calls": 100000,
+        "export_frames": 120,
+        "video_seconds": 10
+    }
+}
+
+BENCHMARKS = ["frame", "compute_audio", "audio_length", "export_frame", "export_sequence", "export_video"]
+
+# Frames per second the sequence and video exports are made at
+EXPORT_FPS = 30
+
+# Audio settings for the video benchmark
+#   moviepy fails to read audio much faster than 1MHz, so large inputs make longer videos
+VIDEO_NUM_CHANNELS = 2
+VIDEO_SAMPLE_BYTES = 4
+MAX_VIDEO_SAMPLE_RATE = 1024 ** 2
+
+
+# Frame timestamps spread evenly over the whole file
+def get_spread_ms(bw, count):
+    return np.linspace(0, bw.audio_length_ms, count, endpoint=False).round().astype(int)
+
+
+# How long the benchmark video for an input size is (s), at least min_seconds
+def get_video_seconds(size, min_seconds):
+    return max(min_seconds, math.ceil(size / (VIDEO_NUM_CHANNELS * VIDEO_SAMPLE_BYTES * MAX_VIDEO_SAMPLE_RATE)))
+
+
+def get_video_sample_rate(size, seconds):
+    return max(size // (VIDEO_NUM_CHANNELS * VIDEO_SAMPLE_BYTES * seconds), 1)
+
+
+def get_frame_bytes(bw):
+    return bw.width * bw.height * bw.color_bytes
+
+
+# Time get_frame_bytestring across the file
+#   The frame cache is turned off, every frame is generated from the file
+def bench_frame(filename, params):
+    bw = generators.BinaryWaterfall(
+        filename=filename,
+        width=params["width"],
+        height=params["height"],
+        color_format_string=params["color_format"],
+        playhead_visible=params["playhead"],
+        frame_cache_bytes=0
+    )
+    try:
+        for ms in get_spread_ms(bw, params["warmup_frames"]):
+            bw.get_frame_bytestring(ms)
+
+        timer = stats.Timer()
+        frame_bytes = get_frame_bytes(bw)
+        for ms in get_spread_ms(bw, params["frames"]):
+            timer.time(bw.get_frame_bytestring, ms, frame_count=1, byte_count=frame_bytes)
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+def bench_compute_audio(filename, params):
+    bw = generators.BinaryWaterfall(filename=filename)
+    try:
+        timer = stats.Timer()
+        for _ in range(params["repeats"]):
+            timer.time(bw.compute_audio, byte_count=bw.total_bytes)
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+def bench_audio_length(filename, params):
+    bw = generators.BinaryWaterfall(filename=filename)
+    try:
+        timer = stats.Timer()
+        for _ in range(params["calls"]):
+            timer.time(bw.get_audio_length)
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+def bench_export_frame(filename, params):
+    bw = generators.BinaryWaterfall(filename=filename)
+    renderer = renderers.Renderer(binary_waterfall=bw)
+    size = renderer.get_default_export_size()
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            timer = stats.Timer()
+            frame_bytes = get_frame_bytes(bw)
+            for idx, ms in enumerate(get_spread_ms(bw, params["frames"])):
+                timer.time(
+                    renderer.export_frame,
+                    ms=ms,
+                    filename=os.path.join(temp_dir, f"{idx}.png"),
+                    size=size,
+                    frame_count=1,
+                    byte_count=frame_bytes
+                )
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+# Time exporting the first frames of an image sequence
+def bench_export_sequence(filename, params):
+    bw = generators.BinaryWaterfall(filename=filename)
+    renderer = renderers.Renderer(binary_waterfall=bw)
+    frames = range(min(params["frames"], renderer.get_frame_count(EXPORT_FPS)))
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            timer = stats.Timer()
+            timer.time(
+                renderer.export_sequence,
+                directory=temp_dir,
+                fps=EXPORT_FPS,
+                size=renderer.get_default_export_size(),
+                workers=params["workers"],
+                frames=frames,
+                frame_count=len(frames),
+                byte_count=len(frames) * get_frame_bytes(bw)
+            )
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+# Time exporting a whole video (including making its audio)
+#   The audio is set to the widest samples and a sample rate that plays the whole input in a few
+#   seconds (see get_video_seconds), so big inputs don't make hours of video
+def bench_export_video(filename, params):
+    bw = generators.BinaryWaterfall(
+        filename=filename,
+        num_channels=VIDEO_NUM_CHANNELS,
+        sample_bytes=VIDEO_SAMPLE_BYTES,
+        sample_rate=get_video_sample_rate(os.path.getsize(filename), params["seconds"])
+    )
+    renderer = renderers.Renderer(binary_waterfall=bw)
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            video_file = os.path.join(temp_dir, f"video{constants.VideoFormatCode.MP4.value}")
+            timer = stats.Timer()
+            timer.time(
+                renderer.export_video,
+                filename=video_file,
+                fps=EXPORT_FPS,
+                size=renderer.get_default_export_size(),
+                codec=renderer.get_default_video_codec(video_file).value,
+                audio_codec=constants.AudioCodecCode.MP3.value,
+                preset=constants.EncoderPresetCode.ULTRAFAST.value,
+                frame_count=renderer.get_frame_count(EXPORT_FPS),
+                byte_count=bw.total_bytes
+            )
+    finally:
+        bw.cleanup()
+
+    return timer.get_result()
+
+
+BENCHMARK_FUNCTIONS = {
+    "frame": bench_frame,
+    "compute_audio": bench_compute_audio,
+    "audio_length": bench_audio_length,
+    "export_frame": bench_export_frame,
+    "export_sequence": bench_export_sequence,
+    "export_video": bench_export_video
+}
+
+
+# A name for a case that stays the same between runs, used to match up results when comparing
+def get_case_key(case):
+    parts = [case["benchmark"], f"size={inputs.format_size(case['size'])}"]
+    parts += [f"{key}={value}" for key, value in case["params"].items() if key in case["key_params"]]
+
+    return "/".join(parts)
+
+
+def make_case(benchmark, size, params, key_params):
+    result = dict()
+    result["benchmark"] = benchmark
+    result["size"] = size
+    result["params"] = params
+    result["key_params"] = key_params
+    result["key"] = get_case_key(result)
+
+    return result
+
+
+# Every case in a profile, for the given benchmarks and input sizes (in bytes)
+def get_cases(profile, benchmarks=None, sizes=None):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile \"{profile}\", must be one of {', '.join(PROFILES)}")
+
+    settings = PROFILES[profile]
+
+    if benchmarks is None:
+        benchmarks = BENCHMARKS
+    for benchmark in benchmarks:
+        if benchmark not in BENCHMARK_FUNCTIONS:
+            raise ValueError(f"Unknown benchmark \"{benchmark}\", must be one of {', '.join(BENCHMARKS)}")
+
+    if sizes is None:
+        sizes = [inputs.parse_size(x) for x in settings["sizes"]]
+
+    result = list()
+    for size in sizes:
+        for benchmark in benchmarks:
+            if benchmark == "frame":
+                for width, height in settings["dims"]:
+                    for color_format in settings["color_formats"]:
+                        for playhead in settings["playheads"]:
+                            params = {
+                                "width": width,
+                                "height": height,
+                                "color_format": color_format,
+                                "playhead": playhead,
+                                "frames": settings["frames"],
+                                "warmup_frames": settings["warmup_frames"]
+                            }
+                            result.append(make_case(benchmark, size, params,
+                                                    ["width", "height", "color_format", "playhead"]))
+            elif benchmark == "compute_audio":
+                result.append(make_case(benchmark, size, {"repeats": settings["audio_repeats"]}, []))
+            elif benchmark == "audio_length":
+                result.append(make_case(benchmark, size, {"calls": settings["audio_length_calls"]}, []))
+            elif benchmark == "export_frame":
+                result.append(make_case(benchmark, size, {"frames": settings["export_frames"]}, []))
+            elif benchmark == "export_sequence":
+                # Keyed by the mode, not the worker count (the CPU count), so runs on other machines still match
+                for mode, workers in [("serial", 1), ("parallel", constants.DEFAULTS["export_workers"])]:
+                    params = {"frames": settings["export_frames"], "mode": mode, "workers": workers}
+                    result.append(make_case(benchmark, size, params, ["mode"]))
+            elif benchmark == "export_video":
+                params = {"seconds": get_video_seconds(size, settings["video_seconds"])}
+                result.append(make_case(benchmark, size, params, []))
+
+    return result
+
+
+# Run one case (used by worker processes, so each case's peak memory use is its own)
+def run_case(case, filename):
+    result = dict()
+    result["key"] = case["key"]
+    result["benchmark"] = case["benchmark"]
+    result["size"] = case["size"]
+    result["params"] = case["params"]
+
+    # Keep the encoders' messages out of the results (which can be printed to stdout)
+    with contextlib.redirect_stdout(sys.stderr):
+        result.update(BENCHMARK_FUNCTIONS[case["benchmark"]](filename, case["params"]))
+
+    return result
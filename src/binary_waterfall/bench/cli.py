@@ -0,0 +1,158 @@
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+import concurrent.futures
+
+from .. import constants
+from . import cases, inputs, compare
+
+
+# Run a case in its own worker process, so the peak memory use it reports is only its own
+def run_isolated(case, filename):
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(cases.run_case, case, filename).result()
+
+
+def format_result(result):
+    if result.get("error") is not None:
+        return f"{result['key']}: {result['error']}"
+
+    parts = list()
+    if result["frames_per_second"] is not None:
+        parts.append(f"{result['frames_per_second']:.1f} frames/s")
+    if result["mb_per_second"] is not None:
+        parts.append(f"{result['mb_per_second']:.1f} MB/s")
+    parts.append(f"p50 {result['p50_ms']:.3f}ms")
+    parts.append(f"p99 {result['p99_ms']:.3f}ms")
+    if result["peak_rss_mb"] is not None:
+        parts.append(f"peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    return f"{result['key']}: {', '.join(parts)}"
+
+
+def run_benchmarks(profile, benchmarks=None, sizes=None, input_dir=None, log_stream=sys.stderr):
+    if input_dir is None:
+        input_dir = inputs.get_default_input_dir()
+
+    case_list = cases.get_cases(profile=profile, benchmarks=benchmarks, sizes=sizes)
+
+    result = dict()
+    result["version"] = constants.VERSION
+    result["profile"] = profile
+    result["python"] = platform.python_version()
+    result["platform"] = platform.platform()
+    result["machine"] = platform.machine()
+    result["cpu_count"] = constants.DEFAULTS["export_workers"]
+    result["created"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    result["results"] = list()
+
+    start_time = time.perf_counter()
+    filenames = dict()
+    for idx, case in enumerate(case_list):
+        if case["size"] not in filenames:
+            if log_stream is not None:
+                log_stream.write(f"Preparing {inputs.format_size(case['size'])} input...\n")
+            filenames[case["size"]] = inputs.make_input(input_dir, case["size"])
+
+        try:
+            case_result = run_isolated(case, filenames[case["size"]])
+        except Exception as e:
+            case_result = dict()
+            case_result["key"] = case["key"]
+            case_result["benchmark"] = case["benchmark"]
+            case_result["size"] = case["size"]
+            case_result["params"] = case["params"]
+            case_result["error"] = f"{type(e).__name__}: {e}"
+        result["results"].append(case_result)
+
+        if log_stream is not None:
+            log_stream.write(f"[{idx + 1}/{len(case_list)}] {format_result(case_result)}\n")
+            log_stream.flush()
+    result["seconds"] = time.perf_counter() - start_time
+
+    return result
+
+
+def load_results(filename):
+    with open(filename, "r") as f:
+        return json.load(f)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m binary_waterfall.bench",
+        description=f"{constants.TITLE} benchmarks, times frame generation, audio and exports on synthetic inputs"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-p", "--profile", choices=list(cases.PROFILES), default="quick",
+                            help="benchmark matrix to run (default: %(default)s)")
+    run_parser.add_argument("-b", "--benchmarks", nargs="+", choices=cases.BENCHMARKS, default=None,
+                            help="only run these benchmarks (default: all)")
+    run_parser.add_argument("-s", "--sizes", nargs="+", type=inputs.parse_size, default=None,
+                            help="input sizes, like 1MB or 4GB (default: the profile's)")
+    run_parser.add_argument("--input-dir", default=inputs.get_default_input_dir(),
+                            help="where the synthetic inputs are kept between runs (default: %(default)s)")
+    run_parser.add_argument("-o", "--output", default=None, help="JSON results file (default: print them)")
+    run_parser.add_argument("--baseline", default=None, help="results file to check this run against")
+    run_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="how much worse (a fraction) counts as a regression (default: %(default)s)")
+    run_parser.add_argument("-q", "--quiet", action="store_true", help="don't print progress")
+
+    compare_parser = subparsers.add_parser("compare", help="check a results file against a baseline")
+    compare_parser.add_argument("baseline", help="baseline results file")
+    compare_parser.add_argument("current", help="results file to check")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="how much worse (a fraction) counts as a regression (default: %(default)s)")
+
+    return parser
+
+
+# Print a comparison, returns the exit code (1 if anything regressed)
+def report_comparison(baseline, current, threshold):
+    comparison = compare.compare_results(baseline, current, threshold=threshold)
+    print(compare.format_comparison(comparison), file=sys.stderr)
+
+    return 1 if len(comparison["regressions"]) > 0 or len(comparison["failed"]) > 0 else 0
+
+
+def main(args):
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    try:
+        if args.command == "compare":
+            return report_comparison(load_results(args.baseline), load_results(args.current), args.threshold)
+
+        baseline = load_results(args.baseline) if args.baseline is not None else None
+        results = run_benchmarks(
+            profile=args.profile,
+            benchmarks=args.benchmarks,
+            sizes=args.sizes,
+            input_dir=args.input_dir,
+            log_stream=None if args.quiet else sys.stderr
+        )
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        return report_comparison(baseline, results, args.threshold)
+
+    return 0
+
+
+def run():
+    sys.exit(main(sys.argv[1:]))
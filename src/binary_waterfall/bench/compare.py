@@ -0,0 +1,85 @@
+# The measurements compared between runs, and whether bigger numbers are better
+METRICS = {
+    "frames_per_second": True,
+    "mb_per_second": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False
+}
+
+# Latency changes smaller than this (ms) are timer noise, not regressions
+MIN_LATENCY_CHANGE_MS = 0.01
+
+
+# How much worse value is than baseline_value, as a fraction of baseline_value (negative if it's better)
+def get_slowdown(metric, baseline_value, value):
+    if METRICS[metric]:
+        return (baseline_value - value) / baseline_value
+
+    return (value - baseline_value) / baseline_value
+
+
+# Compare two benchmark runs, finding every measurement that got worse by more than threshold (a fraction)
+#   Cases are matched by their key, ones that are only in one of the runs are listed but not compared
+def compare_results(baseline, current, threshold=0.1):
+    baseline_cases = {x["key"]: x for x in baseline["results"]}
+    current_cases = {x["key"]: x for x in current["results"]}
+
+    result = dict()
+    result["threshold"] = threshold
+    result["regressions"] = list()
+    result["improvements"] = list()
+    result["missing"] = sorted(set(baseline_cases) - set(current_cases))
+    result["new"] = sorted(set(current_cases) - set(baseline_cases))
+    result["failed"] = sorted(key for key, case in current_cases.items() if case.get("error") is not None)
+
+    for key in sorted(set(baseline_cases) & set(current_cases)):
+        for metric in METRICS:
+            baseline_value = baseline_cases[key].get(metric)
+            value = current_cases[key].get(metric)
+            if baseline_value is None or value is None or baseline_value == 0:
+                continue
+
+            if metric.endswith("_ms") and abs(value - baseline_value) < MIN_LATENCY_CHANGE_MS:
+                continue
+
+            change = dict()
+            change["key"] = key
+            change["metric"] = metric
+            change["baseline"] = baseline_value
+            change["current"] = value
+            change["slowdown"] = get_slowdown(metric, baseline_value, value)
+
+            if change["slowdown"] > threshold:
+                result["regressions"].append(change)
+            elif change["slowdown"] < -threshold:
+                result["improvements"].append(change)
+
+    return result
+
+
+def format_change(change):
+    direction = "worse" if change["slowdown"] > 0 else "better"
+
+    return f"{change['key']} {change['metric']}: {change['baseline']:.4g} -> {change['current']:.4g} " \
+           f"({abs(change['slowdown']):.1%} {direction})"
+
+
+def format_comparison(comparison):
+    lines = list()
+    for change in comparison["regressions"]:
+        lines.append(f"REGRESSION: {format_change(change)}")
+    for change in comparison["improvements"]:
+        lines.append(f"improved: {format_change(change)}")
+    for key in comparison["failed"]:
+        lines.append(f"FAILED: {key}")
+    for key in comparison["missing"]:
+        lines.append(f"missing from this run: {key}")
+    for key in comparison["new"]:
+        lines.append(f"not in the baseline: {key}")
+
+    lines.append(f"{len(comparison['regressions'])} regressions, {len(comparison['failed'])} failures, "
+                 f"{len(comparison['improvements'])} improvements "
+                 f"(threshold {comparison['threshold']:.0%})")
+
+    return "\n".join(lines)
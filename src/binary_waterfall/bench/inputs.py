@@ -0,0 +1,63 @@
+import os
+import re
+import tempfile
+import numpy as np
+
+SIZE_UNITS = {
+    "B": 1,
+    "KB": 1024,
+    "MB": 1024 ** 2,
+    "GB": 1024 ** 3
+}
+
+# Inputs are written in blocks of this many bytes
+BLOCK_BYTES = 16 * 1024 ** 2
+
+
+# Parse a size like "1MB" or "4GB" into bytes
+def parse_size(value):
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?B)?\s*", str(value).upper())
+    if match is None:
+        raise ValueError(f"Invalid size \"{value}\", must be like 512KB, 1MB or 4GB")
+
+    number, unit = match.groups()
+
+    return round(float(number) * SIZE_UNITS[unit or "B"])
+
+
+# Format a number of bytes in the largest unit it is a whole number of (like "64MB")
+def format_size(size):
+    for unit, unit_bytes in reversed(SIZE_UNITS.items()):
+        if size >= unit_bytes and size % unit_bytes == 0:
+            return f"{size // unit_bytes}{unit}"
+
+    return f"{size}B"
+
+
+def get_default_input_dir():
+    return os.path.join(tempfile.gettempdir(), "binary-waterfall-bench")
+
+
+def get_input_filename(directory, size, seed=0):
+    return os.path.join(directory, f"input-{format_size(size)}-{seed}.bin")
+
+
+# Make (or reuse) a synthetic input file of random bytes
+#   The bytes only depend on the size and seed, so inputs are the same between runs and machines
+#   and are kept between runs (a 4GB input takes a while to write)
+def make_input(directory, size, seed=0):
+    filename = get_input_filename(directory, size, seed)
+    if os.path.isfile(filename) and os.path.getsize(filename) == size:
+        return filename
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary name first, so an interrupted write is never reused
+    partial_filename = f"{filename}.partial"
+    rng = np.random.default_rng(seed)
+    with open(partial_filename, "wb") as f:
+        for address in range(0, size, BLOCK_BYTES):
+            f.write(rng.bytes(min(BLOCK_BYTES, size - address)))
+    os.replace(partial_filename, filename)
+
+    return filename
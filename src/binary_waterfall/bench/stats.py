@@ -0,0 +1,69 @@
+import sys
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+# The peak resident set size of this process so far (MB), or None if it can't be measured here
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        # Bytes on macOS, KB everywhere else
+        return peak / 1024 ** 2
+
+    return peak / 1024
+
+
+# Latency timer class
+#   Times each call of a benchmarked operation, and sums up the
+#   timings (with the amount of work done) into a result
+class Timer:
+    def __init__(self):
+        self.latencies = list()
+        self.frames = 0
+        self.bytes = 0
+
+    # Time one call of function, counting the frames and input bytes it worked through
+    def time(self, function, *args, frame_count=0, byte_count=0, **kwargs):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start_time)
+
+        self.frames += frame_count
+        self.bytes += byte_count
+
+        return result
+
+    def get_result(self):
+        result = dict()
+        result["count"] = len(self.latencies)
+        result["seconds"] = sum(self.latencies)
+
+        if result["seconds"] > 0 and self.frames > 0:
+            result["frames_per_second"] = self.frames / result["seconds"]
+        else:
+            result["frames_per_second"] = None
+
+        if result["seconds"] > 0 and self.bytes > 0:
+            result["mb_per_second"] = self.bytes / 1024 ** 2 / result["seconds"]
+        else:
+            result["mb_per_second"] = None
+
+        if len(self.latencies) > 0:
+            result["p50_ms"] = float(np.percentile(self.latencies, 50)) * 1000
+            result["p99_ms"] = float(np.percentile(self.latencies, 99)) * 1000
+        else:
+            result["p50_ms"] = None
+            result["p99_ms"] = None
+
+        result["peak_rss_mb"] = get_peak_rss_mb()
+
+        return result
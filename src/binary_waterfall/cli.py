@@ -0,0 +1,458 @@
+import os
+import sys
+import argparse
+
+from . import constants, generators, renderers, helpers, tracing
+
+
+# Console progress class
+#   Stands in for a QProgressDialog (the same methods the renderers call),
+#   printing the progress to a text stream instead
+class ConsoleProgress:
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.label = ""
+        self.maximum = 100
+        self.value = 0
+        self.last_line = None
+
+    def setLabelText(self, text):
+        self.label = text
+        self.draw()
+
+    def setMaximum(self, maximum):
+        self.maximum = maximum
+
+    def setValue(self, value):
+        self.value = value
+        self.draw()
+
+    def setAutoReset(self, auto_reset):
+        pass
+
+    def wasCanceled(self):
+        return False
+
+    def draw(self):
+        if self.maximum > 0:
+            percent = min(max(round(100 * self.value / self.maximum), 0), 100)
+        else:
+            percent = 100
+
+        line = f"{self.label} {percent}%".strip()
+        if line != self.last_line:
+            self.stream.write(f"\r{line}\033[K")
+            self.stream.flush()
+            self.last_line = line
+
+    def finish(self):
+        if self.last_line is not None:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+def add_visualization_arguments(parser):
+    group = parser.add_argument_group("video settings")
+    group.add_argument("--width", type=int, default=constants.DEFAULTS["width"],
+                       help="visualization width in pixels (default: %(default)s)")
+    group.add_argument("--height", type=int, default=constants.DEFAULTS["height"],
+                       help="visualization height in pixels (default: %(default)s)")
+    group.add_argument("--color-format", default=constants.DEFAULTS["color_format_string"],
+                       help="color format string, \"r\", \"g\", \"b\", \"w\" or \"x\" per byte, capitalized to invert "
+                            "(default: %(default)s)")
+    group.add_argument("--flip-v", action=argparse.BooleanOptionalAction, default=constants.DEFAULTS["flip_v"],
+                       help="flip the image vertically")
+    group.add_argument("--flip-h", action=argparse.BooleanOptionalAction, default=constants.DEFAULTS["flip_h"],
+                       help="flip the image horizontally")
+    group.add_argument("--alignment", choices=[x.name.lower() for x in constants.AlignmentCode],
+                       default=constants.DEFAULTS["alignment"].name.lower(),
+                       help="where the playhead sits in the frame (default: %(default)s)")
+    group.add_argument("--playhead", action=argparse.BooleanOptionalAction,
+                       default=constants.DEFAULTS["playhead_visible"],
+                       help="show the playhead")
+
+
+def add_audio_arguments(parser):
+    group = parser.add_argument_group("audio settings")
+    group.add_argument("--channels", type=int, choices=[1, 2], default=constants.DEFAULTS["num_channels"],
+                       help="number of audio channels (default: %(default)s)")
+    group.add_argument("--sample-bytes", type=int, choices=[1, 2, 3, 4], default=constants.DEFAULTS["sample_bytes"],
+                       help="bytes per audio sample (default: %(default)s)")
+    group.add_argument("--sample-rate", type=int, default=constants.DEFAULTS["sample_rate"],
+                       help="audio sample rate in Hz (default: %(default)s)")
+    group.add_argument("--volume", type=int, default=constants.DEFAULTS["file_volume"],
+                       help="audio volume from 0 to 100 (default: %(default)s)")
+
+
+def add_export_size_arguments(parser):
+    group = parser.add_argument_group("export size")
+    group.add_argument("--export-width", type=int, default=None,
+                       help="exported width in pixels (default: fit the visualization in the player size)")
+    group.add_argument("--export-height", type=int, default=None,
+                       help="exported height in pixels (default: fit the visualization in the player size)")
+    group.add_argument("--keep-aspect", action="store_true",
+                       help="keep the visualization's aspect ratio inside the export size")
+
+
+# Parse a shard argument like "2/4" (shard 2 of 4, counted from 1)
+def parse_shard(value):
+    try:
+        shard, shard_count = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like \"i/N\", not \"{value}\"")
+
+    if shard_count < 1 or not 1 <= shard <= shard_count:
+        raise argparse.ArgumentTypeError(f"shard must be from 1/N to N/N, not \"{value}\"")
+
+    return shard, shard_count
+
+
+def add_shard_argument(parser):
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="only render part I of N of the frames (merge the parts afterwards)")
+
+
+def add_fps_argument(parser):
+    parser.add_argument("--fps", type=float, default=60.0,
+                        help="frames per second (default: %(default)s)")
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="binary-waterfall-render",
+        description=f"{constants.TITLE} headless renderer, exports without a display"
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {constants.VERSION}")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print progress")
+    parser.add_argument("--timings", action="store_true",
+                        help="print how long each stage of the export took when it's done")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write a Chrome trace (chrome://tracing or https://ui.perfetto.dev) of the export stages")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    video_parser = subparsers.add_parser("video", help="export a video")
+    video_parser.add_argument("input", help="input file")
+    video_parser.add_argument("output", help=f"output video file "
+                                             f"({', '.join(x.value for x in constants.VideoFormatCode)})")
+    add_fps_argument(video_parser)
+    add_export_size_arguments(video_parser)
+    add_visualization_arguments(video_parser)
+    add_audio_arguments(video_parser)
+    encoder_group = video_parser.add_argument_group("encoder settings")
+    encoder_group.add_argument("--codec", choices=[x.value for x in constants.VideoCodecCode], default=None,
+                               help=f"video codec (default: {constants.VideoCodecCode.LIBX264.value} for "
+                                    f"{constants.VideoFormatCode.MP4.value}, {constants.VideoCodecCode.PNG.value} for "
+                                    f"{constants.VideoFormatCode.AVI.value})")
+    encoder_group.add_argument("--audio-codec", choices=[x.value for x in constants.AudioCodecCode],
+                               default=constants.AudioCodecCode.MP3.value,
+                               help="audio codec (default: %(default)s)")
+    encoder_group.add_argument("--preset", choices=[x.value for x in constants.EncoderPresetCode],
+                               default=constants.EncoderPresetCode.ULTRAFAST.value,
+                               help="encoder preset (default: %(default)s)")
+    encoder_group.add_argument("--bitrate", default=None, help="video bitrate, like \"5000k\"")
+    encoder_group.add_argument("--audio-bitrate", default=None, help="audio bitrate, like \"192k\"")
+    encoder_group.add_argument("--segments", type=int, default=constants.DEFAULTS["video_segments"],
+                               help="encode this many segments in parallel processes (default: %(default)s)")
+    encoder_group.add_argument("--segment-threads", type=int, default=constants.DEFAULTS["video_segment_threads"],
+                               help="encoder threads per segment (default: chosen by the encoder)")
+    add_shard_argument(video_parser)
+
+    sequence_parser = subparsers.add_parser("sequence", help="export an image sequence")
+    sequence_parser.add_argument("input", help="input file")
+    sequence_parser.add_argument("output", help="output directory")
+    add_fps_argument(sequence_parser)
+    sequence_parser.add_argument("--format", choices=[x.value.lstrip(".") for x in constants.ImageFormatCode],
+                                 default=constants.ImageFormatCode.PNG.value.lstrip("."),
+                                 help="image format (default: %(default)s)")
+    sequence_parser.add_argument("--workers", type=int, default=constants.DEFAULTS["export_workers"],
+                                 help="worker processes (default: %(default)s)")
+    add_shard_argument(sequence_parser)
+    add_export_size_arguments(sequence_parser)
+    add_visualization_arguments(sequence_parser)
+    add_audio_arguments(sequence_parser)
+
+    image_parser = subparsers.add_parser("image", help="export a single frame")
+    image_parser.add_argument("input", help="input file")
+    image_parser.add_argument("output", help=f"output image file "
+                                             f"({', '.join(x.value for x in constants.ImageFormatCode)})")
+    image_parser.add_argument("--ms", type=int, default=0, help="timestamp in milliseconds (default: %(default)s)")
+    add_export_size_arguments(image_parser)
+    add_visualization_arguments(image_parser)
+    add_audio_arguments(image_parser)
+
+    audio_parser = subparsers.add_parser("audio", help="export the audio")
+    audio_parser.add_argument("input", help="input file")
+    audio_parser.add_argument("output", help=f"output audio file "
+                                             f"({', '.join(x.value for x in constants.AudioFormatCode)})")
+    add_audio_arguments(audio_parser)
+
+    merge_video_parser = subparsers.add_parser("merge-video", help="join the shards of a video export")
+    merge_video_parser.add_argument("input", help="input file (for the audio)")
+    merge_video_parser.add_argument("output", help="output video file, the same one the shards were exported to")
+    merge_video_parser.add_argument("--shards", type=int, required=True, help="number of shards")
+    merge_video_parser.add_argument("--audio-codec", choices=[x.value for x in constants.AudioCodecCode],
+                                    default=constants.AudioCodecCode.MP3.value,
+                                    help="audio codec (default: %(default)s)")
+    merge_video_parser.add_argument("--audio-bitrate", default=None, help="audio bitrate, like \"192k\"")
+    merge_video_parser.add_argument("--keep-shards", action="store_true", help="don't delete the shard files")
+
+    merge_sequence_parser = subparsers.add_parser("merge-sequence",
+                                                  help="check the shards of an image sequence export are complete")
+    merge_sequence_parser.add_argument("output", help="output directory, the same one the shards were exported to")
+    merge_sequence_parser.add_argument("--shards", type=int, required=True, help="number of shards")
+    merge_sequence_parser.add_argument("--format", choices=[x.value.lstrip(".") for x in constants.ImageFormatCode],
+                                       default=constants.ImageFormatCode.PNG.value.lstrip("."),
+                                       help="image format (default: %(default)s)")
+
+    return parser
+
+
+# Make a BinaryWaterfall from the parsed arguments (arguments that weren't given keep their defaults)
+def get_binary_waterfall(args):
+    settings = dict()
+    settings["filename"] = args.input if "input" in args else None
+
+    if "width" in args:
+        settings["width"] = args.width
+        settings["height"] = args.height
+        settings["color_format_string"] = args.color_format
+        settings["flip_v"] = args.flip_v
+        settings["flip_h"] = args.flip_h
+        settings["alignment"] = constants.AlignmentCode[args.alignment.upper()]
+        settings["playhead_visible"] = args.playhead
+
+    if "channels" in args:
+        settings["num_channels"] = args.channels
+        settings["sample_bytes"] = args.sample_bytes
+        settings["sample_rate"] = args.sample_rate
+        settings["volume"] = args.volume
+
+        if not 0 <= args.volume <= 100:
+            raise ValueError("Volume must be from 0 to 100")
+
+        if args.sample_rate < 1:
+            raise ValueError("Sample rate must be at least 1")
+
+    return generators.BinaryWaterfall(**settings)
+
+
+# The export size, by default the same size the player shows the visualization at
+def get_export_size(args, renderer):
+    width, height = renderer.get_default_export_size()
+
+    if args.export_width is not None:
+        width = args.export_width
+    if args.export_height is not None:
+        height = args.export_height
+
+    if width < 1 or height < 1:
+        raise ValueError("Export size must be at least 1x1")
+
+    return width, height
+
+
+def get_extension(filename):
+    filename_main, filename_ext = os.path.splitext(filename)
+
+    return filename_ext.lower()
+
+
+def export_video(args, renderer, progress):
+    try:
+        constants.VideoFormatCode(get_extension(args.output))
+    except ValueError:
+        raise ValueError(f"Unsupported video format: \"{args.output}\"")
+
+    codec = args.codec
+    if codec is None:
+        codec = renderer.get_default_video_codec(args.output).value
+
+    if args.shard is not None:
+        shard, shard_count = args.shard
+        if progress is not None:
+            progress.setLabelText(f"Exporting video shard {shard}/{shard_count}...")
+
+        renderer.export_video_shard(
+            filename=args.output,
+            fps=args.fps,
+            shard=shard,
+            shard_count=shard_count,
+            size=get_export_size(args, renderer),
+            keep_aspect=args.keep_aspect,
+            codec=codec,
+            bitrate=args.bitrate,
+            preset=args.preset,
+            threads=args.segment_threads
+        )
+        return
+
+    renderer.export_video(
+        filename=args.output,
+        fps=args.fps,
+        size=get_export_size(args, renderer),
+        keep_aspect=args.keep_aspect,
+        progress_dialog=progress,
+        codec=codec,
+        audio_codec=args.audio_codec,
+        bitrate=args.bitrate,
+        audio_bitrate=args.audio_bitrate,
+        preset=args.preset,
+        segments=args.segments,
+        segment_threads=args.segment_threads,
+        # moviepy's own progress bars (only used without a progress display)
+        logger=None if args.quiet else "bar"
+    )
+
+
+def export_sequence(args, renderer, progress):
+    if args.shard is not None:
+        shard, shard_count = args.shard
+        if progress is not None:
+            progress.setLabelText(f"Exporting image sequence shard {shard}/{shard_count}...")
+            progress.setMaximum(len(helpers.get_shard_range(renderer.get_frame_count(fps=args.fps), shard - 1, shard_count)))
+
+        renderer.export_sequence_shard(
+            directory=args.output,
+            fps=args.fps,
+            shard=shard,
+            shard_count=shard_count,
+            size=get_export_size(args, renderer),
+            keep_aspect=args.keep_aspect,
+            image_format=constants.ImageFormatCode(f".{args.format}"),
+            progress_dialog=progress,
+            workers=args.workers
+        )
+        return
+
+    if progress is not None:
+        progress.setLabelText("Exporting image sequence...")
+        progress.setMaximum(renderer.get_frame_count(fps=args.fps))
+
+    renderer.export_sequence(
+        directory=args.output,
+        fps=args.fps,
+        size=get_export_size(args, renderer),
+        keep_aspect=args.keep_aspect,
+        image_format=constants.ImageFormatCode(f".{args.format}"),
+        progress_dialog=progress,
+        workers=args.workers
+    )
+
+
+def export_image(args, renderer, progress):
+    try:
+        constants.ImageFormatCode(get_extension(args.output))
+    except ValueError:
+        raise ValueError(f"Unsupported image format: \"{args.output}\"")
+
+    renderer.export_frame(
+        ms=args.ms,
+        filename=args.output,
+        size=get_export_size(args, renderer),
+        keep_aspect=args.keep_aspect
+    )
+
+
+def export_audio(args, renderer, progress):
+    try:
+        constants.AudioFormatCode(get_extension(args.output))
+    except ValueError:
+        raise ValueError(f"Unsupported audio format: \"{args.output}\"")
+
+    renderer.export_audio(args.output)
+
+
+def merge_video(args, renderer, progress):
+    if progress is not None:
+        progress.setLabelText("Joining video shards...")
+
+    renderer.merge_video_shards(
+        filename=args.output,
+        shard_count=args.shards,
+        audio_codec=args.audio_codec,
+        audio_bitrate=args.audio_bitrate,
+        keep_shards=args.keep_shards
+    )
+
+
+def merge_sequence(args, renderer, progress):
+    renderer.merge_sequence_shards(
+        directory=args.output,
+        shard_count=args.shards,
+        image_format=constants.ImageFormatCode(f".{args.format}")
+    )
+
+
+EXPORT_FUNCTIONS = {
+    "video": export_video,
+    "sequence": export_sequence,
+    "image": export_image,
+    "audio": export_audio,
+    "merge-video": merge_video,
+    "merge-sequence": merge_sequence
+}
+
+
+# Not every command has every argument, so only the ones given are checked
+def check_arguments(parser, args):
+    fps = getattr(args, "fps", None)
+    if fps is not None and not 1 <= fps <= 120:
+        parser.error(f"--fps must be from 1 to 120, not {fps}")
+
+    for name in ["width", "height", "export_width", "export_height"]:
+        value = getattr(args, name, None)
+        if value is not None and value < 1:
+            option = "--" + name.replace("_", "-")
+            parser.error(f"{option} must be more than 0, not {value}")
+
+
+def main(args):
+    parser = get_parser()
+    args = parser.parse_args(args)
+    check_arguments(parser, args)
+    # Relative to where we were run from (and never a bare file name with no directory)
+    args.output = os.path.abspath(args.output)
+
+    if args.quiet:
+        progress = None
+    else:
+        progress = ConsoleProgress()
+
+    if args.timings or args.trace is not None:
+        tracing.enable(record_events=args.trace is not None)
+    else:
+        tracing.enable_from_environment()
+
+    try:
+        bw = get_binary_waterfall(args)
+        try:
+            renderer = renderers.Renderer(binary_waterfall=bw)
+            EXPORT_FUNCTIONS[args.command](args, renderer, progress)
+        finally:
+            bw.cleanup()
+    except (ValueError, OSError, RuntimeError) as e:
+        if progress is not None:
+            progress.finish()
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+    except KeyboardInterrupt:
+        if progress is not None:
+            progress.finish()
+        parser.exit(130, f"{parser.prog}: aborted\n")
+
+    if progress is not None:
+        progress.finish()
+
+    if args.timings or args.trace is not None:
+        tracing.dump(trace_filename=args.trace, stream=sys.stderr if args.timings else None)
+        tracing.disable()
+
+    return 0
+
+
+def run():
+    sys.exit(main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
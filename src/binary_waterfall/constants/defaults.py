@@ -1,3 +1,5 @@
+import os
+
 from . import enums
 
 DEFAULTS = {
@@ -13,5 +15,15 @@ DEFAULTS = {
     "flip_v": True,
     "flip_h": False,
     "max_dim": 512,
-    "player_fps": 120
+    "player_fps": 120,
+    "player_prefetch_frames": 4,
+    "color_format_cache_size": 64,
+    "audio_chunk_bytes": 1024 * 1024,
+    "frame_cache_bytes": 64 * 1024 * 1024,
+    "frame_chunk_size": 64,
+    "export_workers": os.cpu_count() or 1,
+    "export_chunk_frames": 32,
+    "video_segments": 1,
+    "video_segment_threads": None,
+    "stream_audio": True
 }
@@ -1,15 +1,39 @@
 import os
-import yaml
 
 from . import paths
 
+
+# Read a flat "Key: value" YAML file
+#   The version file is only ever simple lines like this, so it's parsed directly
+#   instead of importing yaml (which is slow to load) at startup
+def read_version_file(filename):
+    result = dict()
+
+    with open(filename, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+
+            key, separator, value = line.partition(":")
+            if separator == "":
+                raise ValueError(f"Invalid line in version file: \"{line}\"")
+
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ["\"", "'"]:
+                value = value[1:-1]
+
+            result[key.strip()] = value
+
+    return result
+
+
 # Read program version file
 VERSION_FILE = os.path.join(paths.PATH, "version.yml")
-with open(VERSION_FILE, "r") as f:
-    version_file_dict = yaml.safe_load(f)
-
-    VERSION = version_file_dict["Version"]
-    DESCRIPTION = version_file_dict["FileDescription"]
-    TITLE = version_file_dict["InternalName"]
-    LONG_TITLE = version_file_dict["ProductName"]
-    COPYRIGHT = version_file_dict["LegalCopyright"]
+version_file_dict = read_version_file(VERSION_FILE)
+
+VERSION = version_file_dict["Version"]
+DESCRIPTION = version_file_dict["FileDescription"]
+TITLE = version_file_dict["InternalName"]
+LONG_TITLE = version_file_dict["ProductName"]
+COPYRIGHT = version_file_dict["LegalCopyright"]
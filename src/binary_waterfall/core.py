@@ -4,7 +4,7 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QPalette, QColor
 
-from . import window, constants
+from . import window, constants, tracing
 
 
 # Main window class
@@ -59,6 +59,8 @@ class MainWindow:
 
 
 def main(args):
+    tracing.enable_from_environment()
+
     if constants.HAS_SPLASH:
         import pyi_splash
         pyi_splash.close()
@@ -3,18 +3,204 @@ import shutil
 import tempfile
 import math
 import wave
+import functools
+import collections
+import threading
+import numpy as np
 from PIL import Image, ImageOps
-import pydub
-from PyQt5.QtGui import QImage
 
-from . import constants, helpers
+from . import constants, helpers, sources, tracing
+
+
+# Pixel plan class
+#   A color format compiled down to what the frame renderer needs:
+#   the source byte offset and inversion of each RGB output channel,
+#   and the number of bytes per pixel (stride)
+class PixelPlan:
+    def __init__(self, color_format):
+        self.color_format = tuple(color_format)
+        self.stride = len(self.color_format)
+
+        self.offsets = [None, None, None]
+        self.inverted = [False, False, False]
+        self.grayscale = False
+        for offset, c in enumerate(self.color_format):
+            if c in [constants.ColorFmtCode.RED, constants.ColorFmtCode.RED_INV]:
+                channels = [0]
+            elif c in [constants.ColorFmtCode.GREEN, constants.ColorFmtCode.GREEN_INV]:
+                channels = [1]
+            elif c in [constants.ColorFmtCode.BLUE, constants.ColorFmtCode.BLUE_INV]:
+                channels = [2]
+            elif c in [constants.ColorFmtCode.WHITE, constants.ColorFmtCode.WHITE_INV]:
+                channels = [0, 1, 2]
+                self.grayscale = True
+            else:
+                continue
+
+            for channel in channels:
+                self.offsets[channel] = offset
+                self.inverted[channel] = c in [
+                    constants.ColorFmtCode.RED_INV,
+                    constants.ColorFmtCode.GREEN_INV,
+                    constants.ColorFmtCode.BLUE_INV,
+                    constants.ColorFmtCode.WHITE_INV
+                ]
+
+        # The last byte in a pixel that actually gets displayed
+        self.last_used_offset = max(x for x in self.offsets if x is not None)
+
+        # XOR with 0xFF is the same as 0xFF - x for a byte
+        self.invert_mask = np.array([0xFF if x else 0x00 for x in self.inverted], dtype=np.uint8)
+        self.has_inversion = any(self.inverted)
+
+    # Get the number of pixels that have all of their used channel bytes
+    def get_pixel_count(self, byte_count):
+        return max(0, (byte_count - self.last_used_offset - 1) // self.stride + 1)
+
+    # Convert the bytes of a pixel cut off by the end of the file
+    #   Channels with a missing byte are dropped and the remaining
+    #   bytes shift down, the same way the per-pixel renderer did it
+    def convert_partial(self, pixel_bytes):
+        this_byte = [b"\x00", b"\x00", b"\x00"]
+        for channel in range(3):
+            offset = self.offsets[channel]
+            if offset is None:
+                continue
+
+            value = pixel_bytes[offset:offset + 1]
+            if self.inverted[channel]:
+                value = bytes(0xFF - x for x in value)
+            this_byte[channel] = value
+
+        return b"".join(this_byte).ljust(3, b"\x00")
+
+    # Convert raw file bytes into an (N, 3) array of RGB pixels
+    def convert(self, frame_bytes):
+        raw = np.frombuffer(frame_bytes, dtype=np.uint8)
+
+        pixel_count = self.get_pixel_count(len(raw))
+
+        pixels = np.zeros((pixel_count, 3), dtype=np.uint8)
+        if self.grayscale:
+            pixels[:, :] = raw[self.offsets[0]::self.stride][:pixel_count, None]
+        else:
+            for channel, offset in enumerate(self.offsets):
+                if offset is not None:
+                    pixels[:, channel] = raw[offset::self.stride][:pixel_count]
+
+        if self.has_inversion:
+            pixels ^= self.invert_mask
+
+        partial_bytes = frame_bytes[pixel_count * self.stride:(pixel_count + 1) * self.stride]
+        if len(partial_bytes) > 0:
+            partial_pixel = np.frombuffer(self.convert_partial(partial_bytes), dtype=np.uint8)
+            pixels = np.concatenate([pixels, partial_pixel[None, :]])
+
+        return pixels
+
+
+# Cached color format parsing
+#   The video settings dialog re-validates the format string on every edit
+@functools.lru_cache(maxsize=constants.DEFAULTS["color_format_cache_size"])
+def parse_color_format_cached(color_format_string):
+    return BinaryWaterfall.parse_color_format_uncached(color_format_string)
+
+
+# Compile a color format string into a (cached) PixelPlan
+@functools.lru_cache(maxsize=constants.DEFAULTS["color_format_cache_size"])
+def compile_color_format(color_format_string):
+    parsed_string = parse_color_format_cached(color_format_string)
+
+    if not parsed_string["is_valid"]:
+        raise ValueError(parsed_string["message"])
+
+    return PixelPlan(parsed_string["color_format"])
+
+
+# Frame cache class
+#   A thread-safe least-recently-used cache of rendered frames (NumPy arrays),
+#   limited by the total memory used by the frames in bytes.
+#   Cached frames are made read-only, since they are shared with every caller
+class FrameCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = None
+        self.frames = collections.OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        self.set_max_bytes(max_bytes)
+
+    def set_max_bytes(self, max_bytes):
+        if max_bytes < 0:
+            raise ValueError("Frame cache size must be at least 0 bytes")
+
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    # Drop the least recently used frames until we are within budget (lock must be held)
+    def evict(self):
+        while self.total_bytes > self.max_bytes:
+            key, frame = self.frames.popitem(last=False)
+            self.total_bytes -= frame.nbytes
+            self.evictions += 1
+
+    def get(self, key):
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+            else:
+                self.frames.move_to_end(key)
+                self.hits += 1
+
+        return frame
+
+    def put(self, key, frame):
+        frame.setflags(write=False)
+
+        if frame.nbytes > self.max_bytes:
+            # Would never fit (this also covers a disabled cache)
+            return
+
+        with self.lock:
+            old_frame = self.frames.pop(key, None)
+            if old_frame is not None:
+                self.total_bytes -= old_frame.nbytes
+
+            self.frames[key] = frame
+            self.total_bytes += frame.nbytes
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.total_bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            result = dict()
+            result["hits"] = self.hits
+            result["misses"] = self.misses
+            result["evictions"] = self.evictions
+            result["frames"] = len(self.frames)
+            result["bytes"] = self.total_bytes
+            result["max_bytes"] = self.max_bytes
+
+        return result
 
 
 # Binary Waterfall abstraction class
 #   Provides an abstract object for converting binary files
 #   into audio files and image frames. This object does not
 #   track time or handle playback, it only provides resources
-#   to other code in order to produce the videos
+#   to other code in order to produce the videos.
+#   Frame generation is reentrant: it never changes instance state
+#   and reads the file positionally, so frames can be rendered from
+#   several threads at once (while the settings aren't being changed)
 class BinaryWaterfall:
     def __init__(self,
                  filename=None,
@@ -28,7 +214,8 @@ class BinaryWaterfall:
                  flip_v=constants.DEFAULTS["flip_v"],
                  flip_h=constants.DEFAULTS["flip_h"],
                  alignment=constants.DEFAULTS["alignment"],
-                 playhead_visible=constants.DEFAULTS["playhead_visible"]
+                 playhead_visible=constants.DEFAULTS["playhead_visible"],
+                 frame_cache_bytes=constants.DEFAULTS["frame_cache_bytes"]
                  ):
         # Initialize class variables
         self.audio_length_ms = None
@@ -40,18 +227,22 @@ class BinaryWaterfall:
         self.color_bytes = None
         self.unused_color_bytes = None
         self.used_color_bytes = None
+        self.pixel_plan = None
         self.filename = None
         self.height = None
         self.width = None
         self.dim = None
         self.total_bytes = None
-        self.file = None
+        self.source = None
         self.audio_filename = None
         self.flip_v = None
         self.flip_h = None
         self.alignment = None
         self.playhead_visible = None
 
+        # Make the cache for rendered frames
+        self.frame_cache = FrameCache(max_bytes=frame_cache_bytes)
+
         # Make the temp dir for the class instance
         self.temp_dir = tempfile.mkdtemp()
 
@@ -85,16 +276,36 @@ class BinaryWaterfall:
     def __del__(self):
         self.cleanup()
 
+    # The constructor arguments to make an equivalent instance (used to hand the work to other processes)
+    def get_settings(self):
+        return {
+            "filename": self.filename,
+            "width": self.width,
+            "height": self.height,
+            "color_format_string": self.get_color_format_string(),
+            "num_channels": self.num_channels,
+            "sample_bytes": self.sample_bytes,
+            "sample_rate": self.sample_rate,
+            "volume": self.volume,
+            "flip_v": self.flip_v,
+            "flip_h": self.flip_h,
+            "alignment": self.alignment,
+            "playhead_visible": self.playhead_visible
+        }
+
     def close_file(self):
-        if self.file is not None:
-            self.file.close()
-            self.file = None
+        if self.source is not None:
+            self.source.close()
+            self.source = None
         self.filename = None
 
     def set_filename(self, filename):
         # Delete current audio file if it exists
         self.delete_audio()
 
+        # Cached frames belong to the old file
+        self.frame_cache.clear()
+
         if filename is None:
             # Reset all vars and close the file pointer
             self.close_file()
@@ -107,13 +318,11 @@ class BinaryWaterfall:
 
         self.filename = os.path.realpath(filename)
 
-        # Open file
-        self.file = open(self.filename, "rb")
+        # Open file (memory-mapped if possible)
+        self.source = sources.FileSource(self.filename)
 
         # Get total number of bytes
-        self.file.seek(0, os.SEEK_END)
-        self.total_bytes = self.file.tell()
-        self.file.seek(0)
+        self.total_bytes = self.source.size
 
         # Compute audio file name
         file_path, file_main_name = os.path.split(self.filename)
@@ -129,12 +338,24 @@ class BinaryWaterfall:
         if height < 4:
             raise ValueError("Visualization height must be at least 4")
 
+        if (width, height) != self.dim:
+            self.frame_cache.clear()
+
         self.width = width
         self.height = height
         self.dim = (self.width, self.height)
 
     @staticmethod
     def parse_color_format(color_format_string):
+        # Copy the cached result so callers can't change it
+        result = dict(parse_color_format_cached(color_format_string))
+        if "color_format" in result:
+            result["color_format"] = list(result["color_format"])
+
+        return result
+
+    @staticmethod
+    def parse_color_format_uncached(color_format_string):
         result = {
             "is_valid": True
         }
@@ -265,6 +486,11 @@ class BinaryWaterfall:
         self.color_bytes = parsed_string["color_bytes"]
         self.color_format = parsed_string["color_format"]
 
+        pixel_plan = compile_color_format(color_format_string)
+        if pixel_plan is not self.pixel_plan:
+            self.frame_cache.clear()
+        self.pixel_plan = pixel_plan
+
     def get_color_format_string(self):
         color_format_string = ""
         for x in self.color_format:
@@ -276,15 +502,44 @@ class BinaryWaterfall:
         return self.parse_color_format(color_format_string)["is_valid"]
 
     def set_flip(self, flip_v, flip_h):
+        if (flip_v, flip_h) != (self.flip_v, self.flip_h):
+            self.frame_cache.clear()
+
         self.flip_v = flip_v
         self.flip_h = flip_h
 
     def set_alignment(self, alignment):
+        if alignment != self.alignment:
+            self.frame_cache.clear()
+
         self.alignment = alignment
 
     def set_playhead_visible(self, playhead_visible):
+        if playhead_visible != self.playhead_visible:
+            self.frame_cache.clear()
+
         self.playhead_visible = playhead_visible
 
+    def set_frame_cache_size(self, max_bytes):
+        self.frame_cache.set_max_bytes(max_bytes)
+
+    # Get the frame cache's hit/miss/eviction counters and memory use
+    def get_frame_cache_stats(self):
+        return self.frame_cache.get_stats()
+
+    # Everything that decides what a frame starting at first_row looks like
+    def get_frame_cache_key(self, first_row):
+        return (
+            first_row * self.width * self.color_bytes,
+            self.width,
+            self.height,
+            self.pixel_plan,
+            self.flip_v,
+            self.flip_h,
+            self.alignment,
+            self.playhead_visible
+        )
+
     def set_audio_settings(self,
                            num_channels,
                            sample_bytes,
@@ -303,13 +558,25 @@ class BinaryWaterfall:
         if volume < 0 or volume > 100:
             raise ValueError("Volume must be between 0 and 100")
 
+        # If the samples would be scaled the same way (or not at all), the audio
+        # data doesn't change, so a change of format only needs a new header
+        header_only = volume == self.volume and (volume == 100 or sample_bytes == self.sample_bytes)
+
         self.num_channels = num_channels
         self.sample_bytes = sample_bytes
         self.sample_rate = sample_rate
         self.volume = volume
 
-        # Re-compute audio file
-        self.compute_audio()
+        # The audio file is only made when it's needed, so only update it if it exists
+        if self.audio_file_exists():
+            if header_only:
+                self.update_audio_header()
+            else:
+                # Gets re-computed the next time it's needed
+                self.delete_audio()
+
+        # Get audio length
+        self.audio_length_ms = self.get_audio_length()
 
     def delete_audio(self):
         if self.audio_filename is None:
@@ -320,52 +587,128 @@ class BinaryWaterfall:
         except FileNotFoundError:
             pass
 
+    def audio_file_exists(self):
+        if self.audio_filename is None:
+            return False
+
+        return os.path.isfile(self.audio_filename)
+
+    # Rewrite just the header of the audio file with the current settings
+    def update_audio_header(self):
+        helpers.rewrite_wav_format(
+            filename=self.audio_filename,
+            num_channels=self.num_channels,
+            sample_bytes=self.sample_bytes,
+            sample_rate=self.sample_rate
+        )
+
+    # Get the audio length (ms) straight from the file size and audio settings
+    #   There's no need to decode the audio file for this, every byte is part of a sample
     def get_audio_length(self):
-        audio_length = pydub.AudioSegment.from_file(self.audio_filename).duration_seconds
+        if self.total_bytes is None:
+            return None
+
+        frame_count = self.total_bytes // (self.num_channels * self.sample_bytes)
+        audio_length = frame_count / self.sample_rate
         audio_length_ms = math.ceil(audio_length * 1000)
 
         return audio_length_ms
 
-    def compute_audio(self):
+    # Compute the audio file, returns False if it was canceled
+    def compute_audio(self, progress_callback=None, cancel_event=None):
         if self.filename is None:
             # If there is no file set, reset the vars
             self.audio_length_ms = None
-            return
+            return True
 
         # Delete current file if it exists
         self.delete_audio()
 
-        # Compute the new file (full volume)
-        with wave.open(self.audio_filename, "wb") as f:
-            f.setnchannels(self.num_channels)
-            f.setsampwidth(self.sample_bytes)
-            f.setframerate(self.sample_rate)
-            self.file.seek(0)
-            for chunk in iter(lambda: self.file.read(4096), b""):
-                f.writeframesraw(chunk)
-
-        if self.volume != 100:
-            # Reduce the audio volume
-            factor = self.volume / 100
-            audio = pydub.AudioSegment.from_file(file=self.audio_filename, format="wav")
-            audio += pydub.audio_segment.ratio_to_db(factor)
-            temp_filename = self.audio_filename + ".temp"
-            audio.export(temp_filename, format="wav")
+        if not self.write_audio(self.audio_filename, progress_callback=progress_callback, cancel_event=cancel_event):
+            # Don't leave a partial file behind
             self.delete_audio()
-            shutil.move(temp_filename, self.audio_filename)
+            return False
 
         # Get audio length
         self.audio_length_ms = self.get_audio_length()
 
+        return True
+
+    # Get the audio file name, computing the file first if needed
+    #   The audio file is only made when something needs it (like an export),
+    #   playback streams straight from the input file instead
+    #   Returns None if computing the file was canceled
+    def get_audio_file(self, progress_callback=None, cancel_event=None):
+        if self.filename is None:
+            return None
+
+        if not self.audio_file_exists():
+            if not self.compute_audio(progress_callback=progress_callback, cancel_event=cancel_event):
+                return None
+
+        return self.audio_filename
+
+    # Write the audio out as a WAV file
+    #   progress_callback gets the percentage done, and setting cancel_event (a threading.Event) stops
+    #   the write early. Returns False if it was canceled
+    @tracing.traced("bw.write_audio")
+    def write_audio(self, filename, progress_callback=None, cancel_event=None):
+        # Keep chunks on sample boundaries so each one can be scaled on its own
+        chunk_size = constants.DEFAULTS["audio_chunk_bytes"]
+        chunk_size -= chunk_size % self.sample_bytes
+
+        with wave.open(filename, "wb") as f:
+            f.setnchannels(self.num_channels)
+            f.setsampwidth(self.sample_bytes)
+            f.setframerate(self.sample_rate)
+            for address in range(0, self.total_bytes, chunk_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    return False
+
+                f.writeframesraw(self.get_audio_bytes(address, chunk_size))
+
+                if progress_callback is not None:
+                    progress_callback(math.floor(100 * min(address + chunk_size, self.total_bytes) / self.total_bytes))
+
+        return True
+
+    # Get the audio sample bytes in a window (clipped to the file), at the file volume
+    def get_audio_bytes(self, address, count):
+        if self.volume == 100:
+            return self.source.read(address, count)
+
+        # Scaling works on whole samples, so widen the window to sample boundaries
+        offset = address % self.sample_bytes
+        aligned_count = math.ceil((offset + count) / self.sample_bytes) * self.sample_bytes
+        chunk = helpers.scale_samples(
+            self.source.read(address - offset, aligned_count),
+            self.sample_bytes,
+            helpers.get_volume_factor(self.volume / 100)
+        )
+
+        return chunk[offset:offset + count]
+
+    # Get the header of the WAV file for the current audio settings
+    def get_audio_header(self):
+        return helpers.make_wav_header(
+            num_channels=self.num_channels,
+            sample_bytes=self.sample_bytes,
+            sample_rate=self.sample_rate,
+            data_bytes=self.total_bytes
+        )
+
     def change_filename(self, new_filename):
         self.set_filename(new_filename)
-        self.compute_audio()
 
+        # Get audio length
+        self.audio_length_ms = self.get_audio_length()
+
+    # A zero-copy view of the file bytes in the window (clipped to the file)
     def get_file_bytes(self, address, count):
-        self.file.seek(address)
-        return self.file.read(count)
+        return self.source.read(address, count)
 
-    def get_address(self, ms):
+    # Get the file row index (a "block") at the top of the frame, can be negative
+    def get_frame_row(self, ms):
         # Get the size of a single "block" (a row, we only move in increments of 1 row)
         address_block_size = self.width * self.color_bytes
 
@@ -376,16 +719,42 @@ class BinaryWaterfall:
         address_block_index = round(total_blocks * (ms / self.audio_length_ms))
 
         # Adjust index for other alignments
+        address_block_index -= self.get_alignment_offset()
+
+        return address_block_index
+
+    # Vectorized get_frame_row, a 1D NumPy int64 array of row indices for a sequence of timestamps
+    def get_frame_rows(self, ms_array):
+        address_block_size = self.width * self.color_bytes
+        total_blocks = math.ceil(self.total_bytes / address_block_size)
+
+        # Same float math as get_frame_row, np.round rounds half to even like round()
+        ms_array = np.asarray(ms_array, dtype=np.float64)
+        address_block_indexes = np.round(total_blocks * (ms_array / self.audio_length_ms)).astype(np.int64)
+
+        address_block_indexes -= self.get_alignment_offset()
+
+        return address_block_indexes
+
+    # How many rows the frame starts before the audio location
+    def get_alignment_offset(self):
         if self.alignment == constants.AlignmentCode.START:
-            address_block_index -= self.height
+            return self.height
         elif self.alignment == constants.AlignmentCode.MIDDLE:
-            address_block_index -= round(self.height / 2)
+            return round(self.height / 2)
+        else:
+            return 0
 
+    def get_address(self, ms):
         # Get the base address (end of frame by default)
-        address = address_block_index * address_block_size
+        address = self.get_frame_row(ms) * self.width * self.color_bytes
 
         return address
 
+    # Vectorized get_address
+    def get_addresses(self, ms_array):
+        return self.get_frame_rows(ms_array) * (self.width * self.color_bytes)
+
     def get_playhead_row(self):
         if self.alignment == constants.AlignmentCode.END:
             return 0
@@ -394,91 +763,113 @@ class BinaryWaterfall:
         else:
             return round((self.height - 1) / 2)
 
-    # A 1D Python byte string
-    def get_frame_bytestring(self, ms):
-        picture_bytes = bytes()
-
-        address = self.get_address(ms)
-        # Compensate for negative addresses
-        if address < 0:
-            picture_bytes += b"\x00" * 3 * round(-address / self.color_bytes)
-            address = 0
-
-        # Get the maximum number of bytes that could be used for this frame
-        frame_bytes = self.get_file_bytes(
-            address=address,
-            count=(self.width * self.height * self.color_bytes)
-        )
+    # An (count, width, RGB) NumPy array of file rows, starting at row index first_row
+    #   Rows before the start of the file or after the end of it are black
+    def get_rows_array(self, first_row, count):
+        rows = np.zeros((count, self.width, 3), dtype=np.uint8)
+        row_bytes = self.width * self.color_bytes
+
+        # Compensate for negative addresses (blank rows at the start)
+        start_row = max(first_row, 0)
+        if start_row < first_row + count:
+            # With a memory-mapped file this is only a view, the actual disk reads land in bw.convert
+            with tracing.span("bw.read"):
+                frame_bytes = self.get_file_bytes(
+                    address=start_row * row_bytes,
+                    count=(first_row + count - start_row) * row_bytes
+                )
+            with tracing.span("bw.convert"):
+                pixels = self.pixel_plan.convert(frame_bytes)
 
-        full_length = (self.width * self.height * 3)
-
-        idx = 0
-        for row in range(self.height):
-            for col in range(self.width):
-                # If we already have a full frame, stop the loops
-                if len(picture_bytes) >= full_length:
-                    break
-
-                # Fill one RGB byte value
-                this_byte = [b'\x00', b'\x00', b'\x00']
-                for c in self.color_format:
-                    if c == constants.ColorFmtCode.RED:  # Red
-                        this_byte[0] = frame_bytes[idx:idx + 1]
-                    elif c == constants.ColorFmtCode.RED_INV:  # Red inverted
-                        this_byte[0] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-                    elif c == constants.ColorFmtCode.GREEN:  # Green
-                        this_byte[1] = frame_bytes[idx:idx + 1]
-                    elif c == constants.ColorFmtCode.GREEN_INV:  # Green inverted
-                        this_byte[1] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-                    elif c == constants.ColorFmtCode.BLUE:  # Blue
-                        this_byte[2] = frame_bytes[idx:idx + 1]
-                    elif c == constants.ColorFmtCode.BLUE_INV:  # Blue inverted
-                        this_byte[2] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-                    elif c == constants.ColorFmtCode.WHITE:  # RGB
-                        this_byte[0] = frame_bytes[idx:idx + 1]
-                        this_byte[1] = frame_bytes[idx:idx + 1]
-                        this_byte[2] = frame_bytes[idx:idx + 1]
-                    elif c == constants.ColorFmtCode.WHITE_INV:   # RGB inverted
-                        this_byte[0] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-                        this_byte[1] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-                        this_byte[2] = helpers.filter_rgb_bytes(frame_bytes[idx:idx + 1], helpers.invert)
-
-                    idx += 1
-
-                picture_bytes += b"".join(this_byte)
-            else:
-                continue
-            break
+            # Anything past the end of the file stays black
+            first_pixel = (start_row - first_row) * self.width
+            rows.reshape(-1, 3)[first_pixel:first_pixel + len(pixels)] = pixels
 
-        # Pad picture data if we don't have a full frame (near the end of the file)
-        picture_bytes_length = len(picture_bytes)
-        if picture_bytes_length < full_length:
-            pad_length = full_length - picture_bytes_length
-            picture_bytes += b"\x00" * pad_length
+        return rows
 
-        # Invert playhead row if needed
+    # Invert the playhead row (in place) if needed
+    #   Works on a single frame or a stack of them (n, height, width, RGB)
+    @tracing.traced("bw.playhead")
+    def apply_playhead(self, frame):
         if self.playhead_visible:
-            playhead_row = self.get_playhead_row()
-            row_size = self.width * 3
-            playhead_start = playhead_row * row_size
-            playhead_end = playhead_start + row_size
-
-            playhead = picture_bytes[playhead_start:playhead_end]
-            playhead_contrast = helpers.filter_rgb_bytes(playhead, helpers.pick_shade_from_luminance)
-
-            playhead = helpers.filter_rgb_bytes(playhead, helpers.invert)
-            playhead = helpers.filter_rgb_bytes(playhead, helpers.desaturate)
-            playhead = helpers.average_rgb_bytes(playhead, playhead_contrast)
-
+            playhead = frame[..., self.get_playhead_row(), :, :]
+            pixels = playhead.reshape(-1, 3)
+            playhead_contrast = helpers.pick_shade_from_luminance_array(pixels)
+
+            playhead[:] = helpers.average_array(
+                helpers.desaturate_array(helpers.invert_array(pixels)),
+                playhead_contrast
+            ).reshape(playhead.shape)
+
+        return frame
+
+    # A 3D NumPy array (height, width, RGB)
+    #   Frames come from the frame cache when possible, so they are read-only
+    @tracing.traced("bw.frame")
+    def get_frame_array(self, ms):
+        first_row = self.get_frame_row(ms)
+
+        cache_key = self.get_frame_cache_key(first_row)
+        frame = self.frame_cache.get(cache_key)
+        if frame is None:
+            frame = self.apply_playhead(self.get_rows_array(first_row, self.height))
+            self.frame_cache.put(cache_key, frame)
+
+        return frame
+
+    # A 4D NumPy array (n, height, width, RGB) of the frames at each timestamp in ms_array
+    #   Frames that overlap share a single read and conversion of the rows they cover.
+    #   Like get_frame_array, the frames are not flipped (see flip_frames)
+    @tracing.traced("bw.frames")
+    def get_frames(self, ms_array):
+        first_rows = self.get_frame_rows(ms_array)
+        frames = np.empty((len(first_rows), self.height, self.width, 3), dtype=np.uint8)
+        if len(first_rows) == 0:
+            return frames
+
+        # Work in row order, a frame that doesn't overlap the one before it starts a new group
+        order = np.argsort(first_rows, kind="stable")
+        sorted_rows = first_rows[order]
+        breaks = np.flatnonzero(np.diff(sorted_rows) >= self.height) + 1
+
+        for group in np.split(np.arange(len(order)), breaks):
+            group_rows = sorted_rows[group]
+            low_row = int(group_rows[0])
+            rows = self.get_rows_array(low_row, int(group_rows[-1]) - low_row + self.height)
+
+            for frame_idx, first_row in zip(order[group], group_rows - low_row):
+                frames[frame_idx] = rows[first_row:first_row + self.height]
+
+        return self.apply_playhead(frames)
+
+    # A generator of get_frames arrays, for ms_array in chunks of up to chunk_size frames
+    def iter_frames(self, ms_array, chunk_size=None):
+        if chunk_size is None:
+            chunk_size = constants.DEFAULTS["frame_chunk_size"]
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1 frame")
+
+        ms_array = np.asarray(ms_array)
+        for start in range(0, len(ms_array), chunk_size):
+            yield self.get_frames(ms_array[start:start + chunk_size])
+
+    # Apply the flip settings to a frame or a stack of frames (returns a view)
+    def flip_frames(self, frames):
+        if self.flip_v:
+            frames = frames[..., ::-1, :, :]
+        if self.flip_h:
+            frames = frames[..., ::-1, :]
 
-            picture_bytes = picture_bytes[:playhead_start] + playhead + picture_bytes[playhead_end:]
+        return frames
 
-        return picture_bytes
+    # A 1D Python byte string
+    def get_frame_bytestring(self, ms):
+        return self.get_frame_array(ms).tobytes()
 
-    # A PIL Image (RGB)
-    def get_frame_image(self, ms):
-        frame_bytesring = self.get_frame_bytestring(ms)
-        img = Image.frombytes("RGB", (self.width, self.height), frame_bytesring)
+    # Convert a frame array into a PIL Image (RGB)
+    @tracing.traced("bw.image")
+    def get_image_from_array(self, frame):
+        img = Image.fromarray(frame)
 
         if self.flip_v:
             img = ImageOps.flip(img)
@@ -487,9 +878,18 @@ class BinaryWaterfall:
 
         return img
 
-    # A QImage (RGB)
-    def get_frame_qimage(self, ms):
-        frame_bytesring = self.get_frame_bytestring(ms)
+    # A PIL Image (RGB)
+    def get_frame_image(self, ms):
+        return self.get_image_from_array(self.get_frame_array(ms))
+
+    # Convert a frame array into a QImage (RGB)
+    #   flip=False leaves the flips to whoever draws it (the player's viewer flips it as it paints)
+    @tracing.traced("bw.qimage")
+    def get_qimage_from_array(self, frame, flip=True):
+        # Only the GUI needs Qt, so headless use never imports it
+        from PyQt5.QtGui import QImage
+
+        frame_bytesring = frame.tobytes()
         qimg = QImage(
             frame_bytesring,
             self.width,
@@ -497,16 +897,102 @@ class BinaryWaterfall:
             3 * self.width,
             QImage.Format.Format_RGB888
         )
-        if self.flip_v or self.flip_h:
+        if flip and (self.flip_v or self.flip_h):
             # Flip vertically
             qimg = qimg.mirrored(horizontal=self.flip_h, vertical=self.flip_v)
 
         return qimg
 
+    # A QImage (RGB)
+    def get_frame_qimage(self, ms, flip=True):
+        return self.get_qimage_from_array(self.get_frame_array(ms), flip=flip)
+
     def cleanup(self):
         self.close_file()
         self.delete_audio()
-        shutil.rmtree(self.temp_dir)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+# Rolling frame renderer class
+#   Renders a run of frames from a BinaryWaterfall, where each frame
+#   is usually only a few rows away from the last one. The converted rows
+#   of the last frame are kept in a ring buffer, so only the rows that
+#   scroll into view get converted. Seeks (moving a whole frame or more)
+#   and settings changes fall back to a full render.
+#   Each consumer (player, exporter, thread) should use its own instance
+class RollingRenderer:
+    def __init__(self, binary_waterfall):
+        self.bw = binary_waterfall
+
+        self.rows = None
+        self.head = None
+        self.first_row = None
+        self.settings_key = None
+
+    def reset(self):
+        self.rows = None
+        self.head = None
+        self.first_row = None
+        self.settings_key = None
+
+    # Anything that changes the converted rows (alignment, playhead, and flips are applied later)
+    def get_settings_key(self):
+        return self.bw.source, self.bw.width, self.bw.height, self.bw.pixel_plan
+
+    # Write rows into the ring buffer, starting at ring index start
+    def write_rows(self, start, rows):
+        ring_idx = (start + np.arange(len(rows))) % len(self.rows)
+        self.rows[ring_idx] = rows
+
+    # A 3D NumPy array (height, width, RGB)
+    @tracing.traced("rolling.frame")
+    def get_frame_array(self, ms):
+        first_row = self.bw.get_frame_row(ms)
+        height = self.bw.height
+
+        # Frames we already have don't touch the ring buffer
+        cache_key = self.bw.get_frame_cache_key(first_row)
+        frame = self.bw.frame_cache.get(cache_key)
+        if frame is not None:
+            return frame
+
+        settings_key = self.get_settings_key()
+        if self.rows is None or settings_key != self.settings_key:
+            shift = None
+        else:
+            shift = first_row - self.first_row
+
+        if shift is None or abs(shift) >= height:
+            # Full render
+            self.rows = self.bw.get_rows_array(first_row, height)
+            self.head = 0
+            self.settings_key = settings_key
+        elif shift > 0:
+            # Scrolled forward, the oldest rows get replaced by the new bottom rows
+            new_rows = self.bw.get_rows_array(self.first_row + height, shift)
+            self.write_rows(self.head, new_rows)
+            self.head = (self.head + shift) % height
+        elif shift < 0:
+            # Scrolled back, the newest rows get replaced by the new top rows
+            self.head = (self.head + shift) % height
+            new_rows = self.bw.get_rows_array(first_row, -shift)
+            self.write_rows(self.head, new_rows)
+
+        self.first_row = first_row
+
+        frame = np.concatenate([self.rows[self.head:], self.rows[:self.head]])
+        frame = self.bw.apply_playhead(frame)
+        self.bw.frame_cache.put(cache_key, frame)
+
+        return frame
+
+    # A PIL Image (RGB)
+    def get_frame_image(self, ms):
+        return self.bw.get_image_from_array(self.get_frame_array(ms))
+
+    # A QImage (RGB)
+    def get_frame_qimage(self, ms, flip=True):
+        return self.bw.get_qimage_from_array(self.get_frame_array(ms), flip=flip)
 
 
 # Watermarker class
@@ -0,0 +1,3 @@
+from .backends import BACKENDS, get_available_backends
+from .harness import Harness, get_valid_formats, format_report
+from .cli import main, run
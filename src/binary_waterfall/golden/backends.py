@@ -0,0 +1,117 @@
+import importlib.util
+import numpy as np
+
+from .. import generators
+
+# The optimized render paths checked against the reference
+#   Each one renders the frames for a list of timestamps with a BinaryWaterfall and gives back
+#   the RGB bytes of each frame. "flipped" backends give the frames as displayed (with the flip
+#   settings applied), the others give them unflipped like get_frame_bytestring
+
+
+# The per-frame NumPy renderer, every frame rendered from the file
+def render_frame_bytestring(bw, ms_list):
+    bw.set_frame_cache_size(0)
+
+    return [bw.get_frame_bytestring(ms) for ms in ms_list]
+
+
+# The same renderer, through the frame cache (every frame is asked for twice, the second one is a hit)
+def render_frame_cache(bw, ms_list):
+    bw.set_frame_cache_size(1024 ** 2)
+    for ms in ms_list:
+        bw.get_frame_bytestring(ms)
+
+    return [bw.get_frame_bytestring(ms) for ms in ms_list]
+
+
+# The batch renderer, all frames at once (overlapping frames share their rows)
+def render_frames_batch(bw, ms_list):
+    return [x.tobytes() for x in bw.get_frames(ms_list)]
+
+
+def render_frames_batch_flipped(bw, ms_list):
+    return [x.tobytes() for x in bw.flip_frames(bw.get_frames(ms_list))]
+
+
+# The scrolling renderer the player and exports use, in the order given (so it scrolls and seeks)
+def render_rolling(bw, ms_list):
+    bw.set_frame_cache_size(0)
+    renderer = generators.RollingRenderer(bw)
+
+    return [renderer.get_frame_array(ms).tobytes() for ms in ms_list]
+
+
+def render_pil_image(bw, ms_list):
+    bw.set_frame_cache_size(0)
+
+    return [bw.get_frame_image(ms).tobytes() for ms in ms_list]
+
+
+# The flipped QImages (the rows can be padded, the padding is dropped)
+def render_qimage(bw, ms_list, flip=True):
+    bw.set_frame_cache_size(0)
+
+    result = list()
+    for ms in ms_list:
+        qimg = bw.get_frame_qimage(ms, flip=flip)
+        bits = qimg.constBits()
+        bits.setsize(qimg.sizeInBytes())
+        rows = np.frombuffer(bits, dtype=np.uint8).reshape(qimg.height(), qimg.bytesPerLine())
+        result.append(rows[:, :qimg.width() * 3].tobytes())
+
+    return result
+
+
+# The unflipped QImages the player shows (its viewer flips them as it paints)
+def render_qimage_unflipped(bw, ms_list):
+    return render_qimage(bw, ms_list, flip=False)
+
+
+BACKENDS = {
+    "frame_bytestring": {
+        "function": render_frame_bytestring,
+        "flipped": False
+    },
+    "frame_cache": {
+        "function": render_frame_cache,
+        "flipped": False
+    },
+    "frames_batch": {
+        "function": render_frames_batch,
+        "flipped": False
+    },
+    "frames_batch_flipped": {
+        "function": render_frames_batch_flipped,
+        "flipped": True
+    },
+    "rolling": {
+        "function": render_rolling,
+        "flipped": False
+    },
+    "pil_image": {
+        "function": render_pil_image,
+        "flipped": True
+    },
+    "qimage": {
+        "function": render_qimage,
+        "flipped": True,
+        "requires": "PyQt5"
+    },
+    "qimage_unflipped": {
+        "function": render_qimage_unflipped,
+        "flipped": False,
+        "requires": "PyQt5"
+    }
+}
+
+
+# The names of the backends that can run here (the Qt ones need PyQt5)
+def get_available_backends():
+    result = list()
+    for name, backend in BACKENDS.items():
+        if "requires" in backend and importlib.util.find_spec(backend["requires"]) is None:
+            continue
+        result.append(name)
+
+    return result
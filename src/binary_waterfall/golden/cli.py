@@ -0,0 +1,51 @@
+import sys
+import json
+import time
+import argparse
+
+from .. import constants
+from . import backends, harness
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m binary_waterfall.golden",
+        description=f"Check that the {constants.TITLE} frame renderers match the frozen reference renderer pixel "
+                    f"for pixel"
+    )
+    parser.add_argument("-s", "--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    parser.add_argument("-n", "--cases", type=int, default=200,
+                        help="random cases to check, after the color format cases (default: %(default)s)")
+    parser.add_argument("-f", "--format-length", type=int, default=4,
+                        help="check every valid color format up to this many characters (default: %(default)s)")
+    parser.add_argument("-b", "--backends", nargs="+", choices=list(backends.BACKENDS), default=None,
+                        help="only check these backends (default: all that can run here)")
+    parser.add_argument("--case", default=None, help="only check this case (JSON, as a failure report shows it)")
+
+    return parser
+
+
+def main(args):
+    parser = get_parser()
+    args = parser.parse_args(args)
+
+    checker = harness.Harness(backend_names=args.backends)
+
+    start_time = time.perf_counter()
+    if args.case is not None:
+        try:
+            case = json.loads(args.case)
+        except ValueError as e:
+            parser.exit(1, f"{parser.prog}: error: invalid case: {e}\n")
+        report = checker.run_case(case)
+    else:
+        report = checker.run(seed=args.seed, format_length=args.format_length, random_cases=args.cases)
+
+    print(harness.format_report(report))
+    print(f"{'Passed' if report['passed'] else 'FAILED'} in {time.perf_counter() - start_time:.2f}s")
+
+    return 0 if report["passed"] else 1
+
+
+def run():
+    sys.exit(main(sys.argv[1:]))
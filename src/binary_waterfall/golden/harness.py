@@ -0,0 +1,304 @@
+import os
+import json
+import random
+import itertools
+import tempfile
+import numpy as np
+
+from .. import constants, generators, helpers
+from . import reference, backends
+
+# Color filters checked against the reference, with the number of pixel arrays each one takes
+COLOR_FILTERS = {
+    "pick_shade_from_luminance": (helpers.pick_shade_from_luminance_array, reference.pick_shade_from_luminance, 1),
+    "desaturate": (helpers.desaturate_array, reference.desaturate, 1),
+    "invert": (helpers.invert_array, reference.invert, 1),
+    "average": (helpers.average_array, reference.average, 2)
+}
+
+# Pixel values on and around where the filters round or switch shades
+EDGE_VALUES = [0x00, 0x01, 0x7E, 0x7F, 0x80, 0x81, 0xFE, 0xFF]
+
+
+# Every valid color format string up to max_length characters
+def get_valid_formats(max_length):
+    alphabet = [x.value for x in constants.ColorFmtCode]
+
+    result = list()
+    for length in range(1, max_length + 1):
+        for chars in itertools.product(alphabet, repeat=length):
+            color_format_string = "".join(chars)
+            if generators.BinaryWaterfall.parse_color_format(color_format_string)["is_valid"]:
+                result.append(color_format_string)
+
+    return result
+
+
+# A random valid color format string, of up to max_length characters
+def get_random_format(rng, max_length):
+    if rng.random() < 0.25:
+        channels = [rng.choice([constants.ColorFmtCode.WHITE.value, constants.ColorFmtCode.WHITE_INV.value])]
+    else:
+        channels = rng.sample(["r", "g", "b"], rng.randint(1, 3))
+        channels = [x.upper() if rng.random() < 0.3 else x for x in channels]
+
+    chars = channels + [constants.ColorFmtCode.UNUSED.value] * rng.randint(0, max_length - len(channels))
+    rng.shuffle(chars)
+
+    return "".join(chars)
+
+
+# Random settings for a case, using color_format
+#   scroll_frames is how many nearby frames to check after the edge cases (see get_case_ms)
+def get_random_case(rng, color_format, scroll_frames):
+    result = dict()
+    result["color_format"] = color_format
+    # Small files (often cut off partway through a pixel) and small frames, the reference is slow
+    result["size"] = rng.choice([rng.randint(1, 64), rng.randint(1, 1024), rng.randint(1, 8192)])
+    result["data_seed"] = rng.getrandbits(32)
+    result["width"] = rng.randint(4, 16)
+    result["height"] = rng.randint(4, 16)
+    result["alignment"] = rng.choice(list(constants.AlignmentCode)).name
+    result["flip_v"] = rng.random() < 0.5
+    result["flip_h"] = rng.random() < 0.5
+    result["playhead_visible"] = rng.random() < 0.5
+    result["num_channels"] = rng.choice([1, 2])
+    result["sample_bytes"] = rng.choice([1, 2, 3, 4])
+    result["sample_rate"] = rng.choice([100, 1000, 8000, 32000])
+    result["ms_seed"] = rng.getrandbits(32)
+    result["scroll_frames"] = scroll_frames
+
+    return result
+
+
+# Timestamps to check a case at
+#   The start and end, times before the start and past the end (negative and past-EOF addresses),
+#   and scroll_frames nearby frames, forwards then back (so the rolling renderer scrolls both ways)
+def get_case_ms(case, audio_length_ms):
+    rng = random.Random(case["ms_seed"])
+    length = max(audio_length_ms, 1)
+
+    result = [0, audio_length_ms, rng.randint(0, length)]
+    result += [-rng.randint(1, length), audio_length_ms + rng.randint(1, length)]
+
+    ms = rng.randint(0, length)
+    step = max(length // 50, 1)
+    forward_frames = case["scroll_frames"] - case["scroll_frames"] // 3
+    for idx in range(case["scroll_frames"]):
+        ms += rng.randint(0, step) if idx < forward_frames else -rng.randint(0, step)
+        result.append(ms)
+
+    return result
+
+
+# Where two frame byte strings first differ
+def get_first_difference(expected, actual, width):
+    if len(expected) != len(actual):
+        return {"message": f"frame is {len(actual)} bytes, expected {len(expected)}"}
+
+    differences = np.flatnonzero(np.frombuffer(expected, dtype=np.uint8) != np.frombuffer(actual, dtype=np.uint8))
+    if len(differences) == 0:
+        return None
+
+    pixel = int(differences[0]) // 3
+
+    result = dict()
+    result["row"] = pixel // width
+    result["col"] = pixel % width
+    result["expected"] = tuple(expected[pixel * 3:pixel * 3 + 3])
+    result["actual"] = tuple(actual[pixel * 3:pixel * 3 + 3])
+    result["message"] = f"first difference at row {result['row']}, column {result['col']}: " \
+                        f"expected RGB {result['expected']}, got {result['actual']}"
+
+    return result
+
+
+# Equivalence harness class
+#   Renders random cases with the frozen reference and each backend, and
+#   keeps the first difference found for each backend
+class Harness:
+    def __init__(self, backend_names=None):
+        if backend_names is None:
+            backend_names = backends.get_available_backends()
+        for name in backend_names:
+            if name not in backends.BACKENDS:
+                raise ValueError(f"Unknown backend \"{name}\", must be one of {', '.join(backends.BACKENDS)}")
+
+        self.backend_names = backend_names
+        self.temp_dir = None
+        self.checked = {x: 0 for x in self.backend_names + ["address", "audio_length"]}
+        self.mismatches = dict()
+
+    def add_mismatch(self, name, case, message, ms=None):
+        if name in self.mismatches:
+            # Only the first one
+            return
+
+        result = dict()
+        result["case"] = case
+        result["ms"] = ms
+        result["message"] = message
+        self.mismatches[name] = result
+
+    def check_case(self, case):
+        filename = os.path.join(self.temp_dir, "input.bin")
+        data = random.Random(case["data_seed"]).randbytes(case["size"])
+        with open(filename, "wb") as f:
+            f.write(data)
+
+        color_format = generators.BinaryWaterfall.parse_color_format(case["color_format"])["color_format"]
+        alignment = constants.AlignmentCode[case["alignment"]]
+
+        bw = generators.BinaryWaterfall(
+            filename=filename,
+            width=case["width"],
+            height=case["height"],
+            color_format_string=case["color_format"],
+            num_channels=case["num_channels"],
+            sample_bytes=case["sample_bytes"],
+            sample_rate=case["sample_rate"],
+            flip_v=case["flip_v"],
+            flip_h=case["flip_h"],
+            alignment=alignment,
+            playhead_visible=case["playhead_visible"]
+        )
+        try:
+            # Measured from the WAV file the audio is actually written as
+            audio_filename = os.path.join(self.temp_dir, "audio.wav")
+            bw.write_audio(audio_filename)
+            audio_length_ms = reference.get_audio_length(audio_filename)
+            self.checked["audio_length"] += 1
+            if bw.audio_length_ms != audio_length_ms:
+                self.add_mismatch("audio_length", case, f"expected {audio_length_ms}ms, got {bw.audio_length_ms}ms")
+
+            if audio_length_ms == 0:
+                # Too short to play, there are no frames
+                return
+
+            ms_list = get_case_ms(case, audio_length_ms)
+
+            expected = list()
+            for ms in ms_list:
+                address = reference.get_address(
+                    ms=ms,
+                    total_bytes=len(data),
+                    audio_length_ms=audio_length_ms,
+                    width=case["width"],
+                    height=case["height"],
+                    color_bytes=len(color_format),
+                    alignment=alignment
+                )
+                self.checked["address"] += 1
+                if bw.get_address(ms) != address:
+                    self.add_mismatch("address", case, f"expected address {address}, got {bw.get_address(ms)}", ms)
+
+                expected.append(reference.get_frame_bytestring(
+                    data=data,
+                    address=address,
+                    width=case["width"],
+                    height=case["height"],
+                    color_format=color_format,
+                    alignment=alignment,
+                    playhead_visible=case["playhead_visible"]
+                ))
+            expected_flipped = [
+                reference.flip_frame_bytestring(x, case["width"], case["height"], case["flip_v"], case["flip_h"])
+                for x in expected
+            ]
+
+            for name in self.backend_names:
+                backend = backends.BACKENDS[name]
+                self.checked[name] += 1
+                try:
+                    frames = backend["function"](bw, ms_list)
+                except Exception as e:
+                    self.add_mismatch(name, case, f"{type(e).__name__}: {e}")
+                    continue
+
+                for ms, expected_frame, frame in zip(
+                        ms_list, expected_flipped if backend["flipped"] else expected, frames
+                ):
+                    difference = get_first_difference(expected_frame, frame, case["width"])
+                    if difference is not None:
+                        self.add_mismatch(name, case, difference["message"], ms)
+                        break
+        finally:
+            bw.cleanup()
+
+    # Check the array color filters against the reference on every edge value combination and random pixels
+    def check_colors(self, rng, count):
+        edge_pixels = list(itertools.product(EDGE_VALUES, repeat=3))
+        random_pixels = [tuple(rng.randrange(0x100) for _ in range(3)) for _ in range(count)]
+        pixels = np.array(edge_pixels + random_pixels, dtype=np.uint8)
+        other_pixels = pixels[np.random.default_rng(rng.getrandbits(32)).permutation(len(pixels))]
+
+        for name, (array_function, reference_function, inputs) in COLOR_FILTERS.items():
+            self.checked.setdefault(name, 0)
+            self.checked[name] += len(pixels)
+
+            if inputs == 1:
+                actual = array_function(pixels)
+                expected = reference.filter_rgb_bytes(pixels.tobytes(), reference_function)
+            else:
+                actual = array_function(pixels, other_pixels)
+                expected = reference.average_rgb_bytes(pixels.tobytes(), other_pixels.tobytes())
+
+            difference = get_first_difference(expected, np.ascontiguousarray(actual, dtype=np.uint8).tobytes(), 1)
+            if difference is not None:
+                idx = difference.get("row")
+                if idx is not None:
+                    message = f"pixel {tuple(pixels[idx])}"
+                    if inputs == 2:
+                        message += f" with {tuple(other_pixels[idx])}"
+                    message += f": expected {difference['expected']}, got {difference['actual']}"
+                else:
+                    message = difference["message"]
+                self.add_mismatch(name, None, message)
+
+    # Check every valid color format up to format_length characters, then random_cases random cases
+    def run(self, seed=0, format_length=4, random_cases=200, color_pixels=5000):
+        rng = random.Random(seed)
+
+        self.check_colors(rng, color_pixels)
+
+        with tempfile.TemporaryDirectory() as self.temp_dir:
+            # Only the edge cases for each format, the random cases cover scrolling
+            for color_format in get_valid_formats(format_length):
+                self.check_case(get_random_case(rng, color_format, scroll_frames=0))
+
+            for _ in range(random_cases):
+                self.check_case(get_random_case(rng, get_random_format(rng, max_length=8), scroll_frames=6))
+
+        return self.get_report()
+
+    # Check a single case (like one from a report)
+    def run_case(self, case):
+        with tempfile.TemporaryDirectory() as self.temp_dir:
+            self.check_case(case)
+
+        return self.get_report()
+
+    def get_report(self):
+        result = dict()
+        result["checked"] = dict(self.checked)
+        result["mismatches"] = dict(self.mismatches)
+        result["passed"] = len(self.mismatches) == 0
+
+        return result
+
+
+def format_report(report):
+    lines = list()
+    for name, count in report["checked"].items():
+        mismatch = report["mismatches"].get(name)
+        if mismatch is None:
+            lines.append(f"ok      {name} ({count} checked)")
+            continue
+
+        lines.append(f"FAILED  {name}: {mismatch['message']}")
+        if mismatch["ms"] is not None:
+            lines.append(f"        at {mismatch['ms']}ms")
+        if mismatch["case"] is not None:
+            lines.append(f"        case: {json.dumps(mismatch['case'])}")
+
+    return "\n".join(lines)
@@ -0,0 +1,213 @@
+import math
+from itertools import zip_longest
+
+from .. import constants
+
+# Frozen reference renderer
+#   This is the original pure-Python, per-pixel frame renderer (and the color filters it used),
+#   kept as it was so the faster renderers can be checked against it. Don't optimize or "fix" it,
+#   it defines what a correct frame is. Apart from reading from a bytes object instead of the open
+#   file and taking the settings as arguments, it only differs from the original where the original
+#   was wrong (these are marked "Known deviation" below):
+#   - Inverted channels ("R", "G", "B", "W") ran the channel byte through filter_rgb_bytes, which
+#     pads it out to a whole pixel, so the channel got 3 bytes and every pixel after it was shifted.
+#     The channel now gets just the inverted byte (0xFF - x), as the format string describes
+#   - A frame that starts more than a whole frame before the file (only reachable with negative
+#     timestamps) came out longer than width * height pixels. The extra black pixels were never
+#     shown (the image was built from the first width * height), so the frame is cut to that length
+
+
+def grouper(iterable, n, fillvalue=None):
+    args = [iter(iterable)] * n
+    return zip_longest(*args, fillvalue=fillvalue)
+
+
+def get_luminance(r, g, b):
+    return ((0.299 * r) + (0.587 * g) + (0.114 * b)) / 0xFF
+
+
+def pick_shade_from_luminance(r, g, b, light_shade=0xFF, dark_shade=0x00):
+    if get_luminance(r, g, b) < 0.5:
+        return light_shade, light_shade, light_shade
+    else:
+        return dark_shade, dark_shade, dark_shade
+
+
+def desaturate(r, g, b):
+    gray_value = round((min(r, g, b) + max(r, g, b)) / 2)
+
+    return gray_value, gray_value, gray_value
+
+
+def invert(r, g, b):
+    return (0xFF - x for x in [r, g, b])
+
+
+def average(r1, g1, b1, r2, g2, b2):
+    return (round((x + y) / 2) for x, y in zip((r1, g1, b1), (r2, g2, b2)))
+
+
+def split_rgb_byte(bytestring):
+    r = bytestring[0]
+    g = bytestring[1]
+    b = bytestring[2]
+
+    return r, g, b
+
+
+def filter_rgb_bytes(bytestring, filter_function):
+    result = bytes()
+    for byte in grouper(bytestring, 3, 0x00):
+        r, g, b = split_rgb_byte(byte)
+        r_filtered, g_filtered, b_filtered = filter_function(r, g, b)
+        result += bytes([r_filtered, g_filtered, b_filtered])
+
+    return result
+
+
+def average_rgb_bytes(bytestring_a, bytestring_b):
+    result = bytes()
+    for byte_a, byte_b in zip(grouper(bytestring_a, 3, 0x00), grouper(bytestring_b, 3, 0x00)):
+        r_a, g_a, b_a = split_rgb_byte(byte_a)
+        r_b, g_b, b_b = split_rgb_byte(byte_b)
+        r_average, g_average, b_average = average(r_a, g_a, b_a, r_b, g_b, b_b)
+        result += bytes([r_average, g_average, b_average])
+
+    return result
+
+
+# The audio length (ms) of a WAV file, decoded with pydub the way the original measured it
+def get_audio_length(audio_filename):
+    import pydub
+
+    audio_length = pydub.AudioSegment.from_file(audio_filename).duration_seconds
+    audio_length_ms = math.ceil(audio_length * 1000)
+
+    return audio_length_ms
+
+
+def get_address(ms, total_bytes, audio_length_ms, width, height, color_bytes, alignment):
+    # Get the size of a single "block" (a row, we only move in increments of 1 row)
+    address_block_size = width * color_bytes
+
+    # Get the total number of blocks (rows) in the file (round up because we don't want to clip a row off)
+    total_blocks = math.ceil(total_bytes / address_block_size)
+
+    # Get the block index of the current audio location
+    address_block_index = round(total_blocks * (ms / audio_length_ms))
+
+    # Adjust index for other alignments
+    if alignment == constants.AlignmentCode.START:
+        address_block_index -= height
+    elif alignment == constants.AlignmentCode.MIDDLE:
+        address_block_index -= round(height / 2)
+
+    # Get the base address (end of frame by default)
+    address = address_block_index * address_block_size
+
+    return address
+
+
+def get_playhead_row(height, alignment):
+    if alignment == constants.AlignmentCode.END:
+        return 0
+    elif alignment == constants.AlignmentCode.START:
+        return height - 1
+    else:
+        return round((height - 1) / 2)
+
+
+# A 1D Python byte string of the (unflipped) frame starting at address
+#   color_format is a list of ColorFmtCode, as parse_color_format gives it
+def get_frame_bytestring(data, address, width, height, color_format, alignment, playhead_visible):
+    color_bytes = len(color_format)
+    picture_bytes = bytes()
+
+    # Compensate for negative addresses
+    if address < 0:
+        picture_bytes += b"\x00" * 3 * round(-address / color_bytes)
+        address = 0
+
+    # Get the maximum number of bytes that could be used for this frame
+    frame_bytes = data[address:address + (width * height * color_bytes)]
+
+    full_length = (width * height * 3)
+
+    idx = 0
+    for row in range(height):
+        for col in range(width):
+            # If we already have a full frame, stop the loops
+            if len(picture_bytes) >= full_length:
+                break
+
+            # Fill one RGB byte value
+            this_byte = [b'\x00', b'\x00', b'\x00']
+            for c in color_format:
+                if c == constants.ColorFmtCode.RED:  # Red
+                    this_byte[0] = frame_bytes[idx:idx + 1]
+                # Known deviation, the inverted channels only keep the first (inverted) byte
+                elif c == constants.ColorFmtCode.RED_INV:  # Red inverted
+                    this_byte[0] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+                elif c == constants.ColorFmtCode.GREEN:  # Green
+                    this_byte[1] = frame_bytes[idx:idx + 1]
+                elif c == constants.ColorFmtCode.GREEN_INV:  # Green inverted
+                    this_byte[1] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+                elif c == constants.ColorFmtCode.BLUE:  # Blue
+                    this_byte[2] = frame_bytes[idx:idx + 1]
+                elif c == constants.ColorFmtCode.BLUE_INV:  # Blue inverted
+                    this_byte[2] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+                elif c == constants.ColorFmtCode.WHITE:  # RGB
+                    this_byte[0] = frame_bytes[idx:idx + 1]
+                    this_byte[1] = frame_bytes[idx:idx + 1]
+                    this_byte[2] = frame_bytes[idx:idx + 1]
+                elif c == constants.ColorFmtCode.WHITE_INV:  # RGB inverted
+                    this_byte[0] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+                    this_byte[1] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+                    this_byte[2] = filter_rgb_bytes(frame_bytes[idx:idx + 1], invert)[:1]
+
+                idx += 1
+
+            picture_bytes += b"".join(this_byte)
+        else:
+            continue
+        break
+
+    # Pad picture data if we don't have a full frame (near the end of the file)
+    picture_bytes_length = len(picture_bytes)
+    if picture_bytes_length < full_length:
+        pad_length = full_length - picture_bytes_length
+        picture_bytes += b"\x00" * pad_length
+
+    # Known deviation, cut off anything past a full frame
+    picture_bytes = picture_bytes[:full_length]
+
+    # Invert playhead row if needed
+    if playhead_visible:
+        playhead_row = get_playhead_row(height, alignment)
+        row_size = width * 3
+        playhead_start = playhead_row * row_size
+        playhead_end = playhead_start + row_size
+
+        playhead = picture_bytes[playhead_start:playhead_end]
+        playhead_contrast = filter_rgb_bytes(playhead, pick_shade_from_luminance)
+
+        playhead = filter_rgb_bytes(playhead, invert)
+        playhead = filter_rgb_bytes(playhead, desaturate)
+        playhead = average_rgb_bytes(playhead, playhead_contrast)
+
+        picture_bytes = picture_bytes[:playhead_start] + playhead + picture_bytes[playhead_end:]
+
+    return picture_bytes
+
+
+# Flip a frame byte string the way the image was flipped for display
+def flip_frame_bytestring(picture_bytes, width, height, flip_v, flip_h):
+    row_size = width * 3
+    rows = [picture_bytes[row * row_size:(row + 1) * row_size] for row in range(height)]
+
+    if flip_v:
+        rows = rows[::-1]
+    if flip_h:
+        rows = [b"".join(row[col * 3:(col + 1) * 3] for col in reversed(range(width))) for row in rows]
+
+    return b"".join(rows)
@@ -1,7 +1,13 @@
 from .images import get_size_for_fit_frame, fit_to_frame
-from .qt import QtBarLoggerMoviepy
-from .general import make_file_path, grouper
-from .colors import (
-    pick_shade_from_luminance, desaturate, invert, average,
-    filter_rgb_bytes, average_rgb_bytes
-)
+from .general import make_file_path, ExportCanceled, split_frame_range, get_shard_range
+from .audio import make_wav_header, rewrite_wav_format, get_volume_factor, scale_samples
+from .colors import pick_shade_from_luminance_array, desaturate_array, invert_array, average_array
+
+
+# The moviepy logger needs proglog, so it's only imported when an export first asks for it
+def __getattr__(name):
+    if name == "QtBarLoggerMoviepy":
+        from .qt import QtBarLoggerMoviepy
+        return QtBarLoggerMoviepy
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
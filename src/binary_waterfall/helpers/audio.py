@@ -0,0 +1,106 @@
+import os
+import math
+import struct
+import numpy as np
+
+
+# Make the 44 byte header of a PCM WAV file, the same as the wave module writes
+#   The data size field is only 32 bits, so it's clipped for files over 4 GB
+def make_wav_header(num_channels, sample_bytes, sample_rate, data_bytes):
+    data_bytes = min(data_bytes, 0xFFFFFFFF - 36)
+
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_bytes,
+        b"WAVE",
+        b"fmt ",
+        16,  # Format chunk size
+        1,  # PCM
+        num_channels,
+        sample_rate,
+        sample_rate * num_channels * sample_bytes,  # Bytes per second
+        num_channels * sample_bytes,  # Block align
+        sample_bytes * 8,  # Bits per sample
+        b"data",
+        data_bytes
+    )
+
+
+# Rewrite the format fields in the "fmt " chunk of a PCM WAV file (in place)
+#   The sample data is left untouched, so this only re-interprets the samples
+def rewrite_wav_format(filename, num_channels, sample_bytes, sample_rate):
+    with open(filename, "r+b") as f:
+        riff_id, riff_size, wave_id = struct.unpack("<4sI4s", f.read(12))
+        if riff_id != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"Not a WAV file: \"{filename}\"")
+
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"No format chunk found in WAV file: \"{filename}\"")
+
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if chunk_id == b"fmt ":
+                # Skip the format tag, it stays PCM
+                f.seek(2, os.SEEK_CUR)
+                f.write(struct.pack(
+                    "<HIIHH",
+                    num_channels,
+                    sample_rate,
+                    sample_rate * num_channels * sample_bytes,  # Bytes per second
+                    num_channels * sample_bytes,  # Block align
+                    sample_bytes * 8  # Bits per sample
+                ))
+                return
+
+            # Chunks are padded to an even size
+            f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+
+# Get the sample multiplier for a volume ratio
+#   Goes through decibels the same way pydub does, so the results match it
+def get_volume_factor(ratio):
+    if ratio == 0:
+        return 0.0
+
+    db = 20 * math.log(ratio, 10)
+    return 10 ** (db / 20)
+
+
+# Scale a chunk of PCM samples (as found in a WAV file) by a factor
+#   8-bit samples are unsigned, 16/24/32-bit samples are signed. Like audioop.mul,
+#   scaled values are rounded down (floor) and clipped to the sample range.
+#   Any bytes of an incomplete sample at the end are passed through untouched
+def scale_samples(data, sample_bytes, factor):
+    raw = np.frombuffer(data, dtype=np.uint8)
+    sample_count = len(raw) // sample_bytes
+    sample_raw = raw[:sample_count * sample_bytes]
+
+    if sample_bytes == 1:
+        samples = sample_raw.astype(np.int64) - 0x80
+    elif sample_bytes == 2:
+        samples = sample_raw.view("<i2").astype(np.int64)
+    elif sample_bytes == 3:
+        sample_raw = sample_raw.reshape(-1, 3).astype(np.int64)
+        samples = sample_raw[:, 0] | (sample_raw[:, 1] << 8) | (sample_raw[:, 2] << 16)
+        samples[samples >= 1 << 23] -= 1 << 24
+    elif sample_bytes == 4:
+        samples = sample_raw.view("<i4").astype(np.int64)
+    else:
+        raise ValueError("Invalid sample size (bytes), must be either 1, 2, 3, or 4")
+
+    min_value = -(1 << (sample_bytes * 8 - 1))
+    max_value = (1 << (sample_bytes * 8 - 1)) - 1
+    scaled = np.clip(np.floor(samples * factor), min_value, max_value).astype(np.int64)
+
+    if sample_bytes == 1:
+        scaled_raw = (scaled + 0x80).astype(np.uint8)
+    elif sample_bytes == 2:
+        scaled_raw = scaled.astype("<i2")
+    elif sample_bytes == 3:
+        scaled_raw = scaled.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3]
+    else:
+        scaled_raw = scaled.astype("<i4")
+
+    return scaled_raw.tobytes() + raw[sample_count * sample_bytes:].tobytes()
@@ -1,55 +1,30 @@
-from .general import grouper
+import numpy as np
 
 
-def get_luminance(r, g, b):
-    return ((0.299 * r) + (0.587 * g) + (0.114 * b)) / 0xFF
-
-
-def pick_shade_from_luminance(r, g, b, light_shade=0xFF, dark_shade=0x00):
-    if get_luminance(r, g, b) < 0.5:
-        return light_shade, light_shade, light_shade
-    else:
-        return dark_shade, dark_shade, dark_shade
-
-
-def desaturate(r, g, b):
-    gray_value = round((min(r, g, b) + max(r, g, b)) / 2)
-
-    return gray_value, gray_value, gray_value
-
-
-def invert(r, g, b):
-    return (0xFF - x for x in [r, g, b])
-
-
-def average(r1, g1, b1, r2, g2, b2):
-    return (round((x + y) / 2) for x, y in zip((r1, g1, b1), (r2, g2, b2)))
+# Pixel color filters
+#   These work on an (N, 3) uint8 array of RGB pixels, and give exactly the same
+#   results (including rounding) as the original per-pixel filters, which are kept
+#   in golden.reference to check them against
 
+def get_luminance_array(pixels):
+    r, g, b = (pixels[:, x].astype(np.float64) for x in range(3))
+    return ((0.299 * r) + (0.587 * g) + (0.114 * b)) / 0xFF
 
-def split_rgb_byte(bytestring):
-    r = bytestring[0]
-    g = bytestring[1]
-    b = bytestring[2]
 
-    return r, g, b
+def pick_shade_from_luminance_array(pixels, light_shade=0xFF, dark_shade=0x00):
+    shade = np.where(get_luminance_array(pixels) < 0.5, light_shade, dark_shade).astype(np.uint8)
+    return np.repeat(shade[:, None], 3, axis=1)
 
 
-def filter_rgb_bytes(bytestring, filter_function):
-    result = bytes()
-    for byte in grouper(bytestring, 3, 0x00):
-        r, g, b = split_rgb_byte(byte)
-        r_filtered, g_filtered, b_filtered = filter_function(r, g, b)
-        result += bytes([r_filtered, g_filtered, b_filtered])
+def desaturate_array(pixels):
+    # np.round rounds half to even, the same as Python's round()
+    gray_value = np.round((pixels.min(axis=1).astype(np.float64) + pixels.max(axis=1)) / 2).astype(np.uint8)
+    return np.repeat(gray_value[:, None], 3, axis=1)
 
-    return result
 
+def invert_array(pixels):
+    return 0xFF - pixels
 
-def average_rgb_bytes(bytestring_a, bytestring_b):
-    result = bytes()
-    for byte_a, byte_b in zip(grouper(bytestring_a, 3, 0x00), grouper(bytestring_b, 3, 0x00)):
-        r_a, g_a, b_a = split_rgb_byte(byte_a)
-        r_b, g_b, b_b = split_rgb_byte(byte_b)
-        r_average, g_average, b_average = average(r_a, g_a, b_a, r_b, g_b, b_b)
-        result += bytes([r_average, g_average, b_average])
 
-    return result
+def average_array(pixels_a, pixels_b):
+    return np.round((pixels_a.astype(np.float64) + pixels_b) / 2).astype(np.uint8)
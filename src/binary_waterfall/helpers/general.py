@@ -1,12 +1,36 @@
 import os
-from itertools import zip_longest
+
+
+# Raised (from a progress callback or logger) to stop an export that was canceled
+class ExportCanceled(Exception):
+    pass
 
 
 def make_file_path(filename):
     file_path, file_title = os.path.split(filename)
-    os.makedirs(file_path, exist_ok=True)
+    # A bare file name goes in the current directory, which is already there
+    if file_path != "":
+        os.makedirs(file_path, exist_ok=True)
+
+
+# Split range(count) into (up to) parts consecutive ranges of nearly equal length
+def split_frame_range(count, parts):
+    if parts < 1:
+        raise ValueError("Must split into at least 1 part")
+
+    parts = min(parts, count)
+
+    return [get_shard_range(count, idx, parts) for idx in range(parts)]
+
+
+# Part shard (counted from 0) of range(count) split into shard_count consecutive ranges
+#   Only depends on its arguments, so separate processes (or machines) always agree on the split.
+#   Shards can be empty when there are more shards than items
+def get_shard_range(count, shard, shard_count):
+    if shard_count < 1:
+        raise ValueError("Must split into at least 1 shard")
 
+    if not 0 <= shard < shard_count:
+        raise ValueError(f"Shard must be from 0 to {shard_count - 1}")
 
-def grouper(iterable, n, fillvalue=None):
-    args = [iter(iterable)] * n
-    return zip_longest(*args, fillvalue=fillvalue)
+    return range((count * shard) // shard_count, (count * (shard + 1)) // shard_count)
@@ -1,5 +1,7 @@
 from proglog import ProgressBarLogger
 
+from .general import ExportCanceled
+
 
 # Custom proglog class for QProgressDialogs
 #   Handles updating the progress in a QProgressDialog
@@ -37,3 +39,7 @@ class QtBarLoggerMoviepy(ProgressBarLogger):
     def bars_callback(self, bar, attr, value, old_value=None):
         self.progress_dialog.setMaximum(self.bars[bar]["total"])
         self.set_progress(value)
+
+        # Moviepy can't be told to stop, so break out of the export
+        if self.progress_dialog.wasCanceled():
+            raise ExportCanceled()
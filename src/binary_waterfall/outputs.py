@@ -1,16 +1,65 @@
-import os
-import shutil
 import math
 import time
-import tempfile
-import pydub
-from moviepy.editor import ImageSequenceClip, AudioFileClip
 from PIL import Image
-from PyQt5.QtCore import QUrl
+from PyQt5.QtCore import Qt, QUrl, QIODevice, QTimer
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtGui import QImage
 
-from . import generators, helpers, constants
+from . import generators, scheduler, constants, tracing
+
+
+# WAV stream class
+#   A read-only QIODevice that serves a WAV file made on the fly: a
+#   synthesized header followed by the input file's bytes (at the file volume).
+#   This lets the QMediaPlayer play the input without writing a temporary WAV file
+class WaveStream(QIODevice):
+    def __init__(self, binary_waterfall, parent=None):
+        super().__init__(parent)
+        self.bw = binary_waterfall
+
+        self.header = self.bw.get_audio_header()
+        self.position = 0
+
+        # We track the position ourselves, so don't let Qt buffer ahead
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+    def isSequential(self):
+        return False
+
+    def size(self):
+        return len(self.header) + self.bw.total_bytes
+
+    def seek(self, pos):
+        self.position = pos
+        return super().seek(pos)
+
+    def atEnd(self):
+        return self.position >= self.size()
+
+    # Not sequential, so QIODevice's own count (size() - pos()) would only count the same bytes again
+    def bytesAvailable(self):
+        return max(self.size() - self.position, 0)
+
+    def readData(self, max_size):
+        header_size = len(self.header)
+        start = self.position
+        end = min(start + max_size, self.size())
+
+        chunks = list()
+        if start < header_size:
+            chunks.append(self.header[start:min(end, header_size)])
+
+        data_start = max(start, header_size) - header_size
+        data_end = end - header_size
+        if data_end > data_start:
+            chunks.append(bytes(self.bw.get_audio_bytes(data_start, data_end - data_start)))
+
+        self.position = max(end, start)
+
+        return b"".join(chunks)
+
+    def writeData(self, data):
+        return -1
 
 
 # Image playback class
@@ -22,9 +71,13 @@ class Player:
                  set_playbutton_function=None,
                  set_seekbar_function=None,
                  max_dim=constants.DEFAULTS["max_dim"],
-                 fps=constants.DEFAULTS["player_fps"]
+                 fps=constants.DEFAULTS["player_fps"],
+                 stream_audio=constants.DEFAULTS["stream_audio"],
+                 prefetch_frames=constants.DEFAULTS["player_prefetch_frames"]
                  ):
         self.image = None
+        self.audio_stream = None
+        self.stream_audio = stream_audio
         self.volume = None
         self.fps = None
         self.frame_ms = None
@@ -34,6 +87,10 @@ class Player:
         self.max_dim = None
 
         self.bw = binary_waterfall
+        # Consecutive frames during playback only scroll by a few rows
+        self.frame_renderer = generators.RollingRenderer(self.bw)
+        # The prefetch thread scrolls its own ring buffer
+        self.prefetch_renderer = generators.RollingRenderer(self.bw)
 
         self.display = display
 
@@ -53,8 +110,20 @@ class Player:
         # Set audio playback settings
         self.set_volume(100)
 
-        # Set set_image_timestamp to run when the audio position is changed
-        self.audio.positionChanged.connect(self.set_image_timestamp)
+        # While playing, frames are rendered ahead on a background thread and shown by a timer,
+        # so a slow frame doesn't hold up the event loop (or the seekbar)
+        self.frame_scheduler = scheduler.FrameScheduler(
+            render_function=self.render_frame,
+            frame_ms=1000 / constants.DEFAULTS["player_fps"],
+            reset_function=self.prefetch_renderer.reset,
+            queue_size=prefetch_frames
+        )
+        self.frame_timer = QTimer()
+        self.frame_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.frame_timer.timeout.connect(self.show_next_frame)
+
+        # Follow the audio position (this also shows the frame when paused)
+        self.audio.positionChanged.connect(self.position_changed)
         self.audio.positionChanged.connect(self.set_seekbar_if_given)
         # Also, make sure it's updating more frequently (default is too slow when playing)
         self.fps_min = 1
@@ -67,6 +136,11 @@ class Player:
     def __del__(self):
         self.running = False
 
+    # Stop the frame timer and shut down the prefetch thread (the player can't play after this)
+    def close(self):
+        self.frame_timer.stop()
+        self.frame_scheduler.close()
+
     def set_dims(self, max_dim):
         self.max_dim = max_dim
         if self.bw.width > self.bw.height:
@@ -78,10 +152,14 @@ class Player:
 
         self.dim = (self.width, self.height)
 
+        self.display.set_view_size(self.width, self.height)
+
     def set_fps(self, fps):
         self.fps = min(max(fps, self.fps_min), self.fps_max)
         self.frame_ms = math.floor(1000 / self.fps)
         self.audio.setNotifyInterval(self.frame_ms)
+        self.frame_scheduler.set_frame_ms(1000 / self.fps)
+        self.frame_timer.setInterval(self.frame_ms)
 
     def clear_image(self):
         background_image = Image.new(
@@ -108,11 +186,9 @@ class Player:
         # Change dims
         self.set_dims(max_dim=max_dim)
 
-        # Update image
+        # Update image (the viewer scales frames itself, only the background has to be remade)
         if self.bw.filename is None:
             self.clear_image()
-        else:
-            self.set_image(self.image)
 
     def refresh_dims(self):
         self.update_dims(self.max_dim)
@@ -121,17 +197,16 @@ class Player:
         self.volume = volume
         self.audio.setVolume(volume)
 
-    def scale_image(self, image):
-        return image.scaled(self.width, self.height)
-
-    def set_image(self, image):
-        self.image = self.scale_image(image)
+    # Show an image (of any size, the viewer scales it when it paints)
+    def set_image(self, image, flip_v=False, flip_h=False):
+        self.image = image
 
-        # Compute the QPixmap version
-        qpixmap = QPixmap.fromImage(self.image)
+        with tracing.span("player.show"):
+            self.display.set_image(self.image, flip_v=flip_v, flip_h=flip_h)
 
-        # Set the picture
-        self.display.setPixmap(qpixmap)
+    # Show an unflipped frame, flipped the way the settings say
+    def set_frame_image(self, image):
+        self.set_image(image, flip_v=self.bw.flip_v, flip_h=self.bw.flip_h)
 
     def get_position(self):
         return self.audio.position()
@@ -166,12 +241,63 @@ class Player:
 
     def state_changed_handler(self, media_state):
         if media_state == self.audio.PlayingState:
+            self.start_frames()
             self.set_playbutton_if_given(play=False)
         elif media_state == self.audio.PausedState:
+            self.stop_frames()
             self.set_playbutton_if_given(play=True)
         elif media_state == self.audio.StoppedState:
+            self.stop_frames()
             self.set_playbutton_if_given(play=True)
 
+    def start_frames(self):
+        if self.bw.filename is None:
+            return
+
+        self.frame_scheduler.start(self.get_position())
+        self.frame_timer.start()
+
+    # Stop prefetching, and show the exact frame where playback stopped
+    def stop_frames(self):
+        self.frame_timer.stop()
+        self.frame_scheduler.stop()
+        self.set_image_timestamp(self.get_position())
+
+    # Stop prefetching while the settings change (frames must never render while they do),
+    # waits for the frame being rendered to finish
+    def hold_frames(self):
+        self.frame_timer.stop()
+        self.frame_scheduler.stop()
+
+    # Start prefetching again after hold_frames (if still playing)
+    def release_frames(self):
+        if self.is_playing():
+            self.start_frames()
+
+    def position_changed(self, ms):
+        if self.frame_timer.isActive():
+            # The timer shows the frames, just keep the clock in step with the audio
+            self.frame_scheduler.sync(ms)
+        else:
+            self.set_image_timestamp(ms)
+
+    # Render a frame (on the prefetch thread), the viewer flips and scales it
+    def render_frame(self, ms):
+        return self.prefetch_renderer.get_frame_qimage(ms, flip=False)
+
+    @tracing.traced("player.tick")
+    def show_next_frame(self):
+        image = self.frame_scheduler.next_frame()
+        if image is not None:
+            self.set_frame_image(image)
+
+    # Frames shown, dropped and late (and more) since the counters were last reset
+    def get_frame_stats(self):
+        return self.frame_scheduler.get_stats()
+
+    def reset_frame_stats(self):
+        self.frame_scheduler.reset_stats()
+
     def play(self):
         self.audio.play()
 
@@ -196,20 +322,36 @@ class Player:
         self.set_position(0)
 
     def set_audio_file(self, filename):
+        old_stream = self.audio_stream
+        self.audio_stream = None
+
         if filename is None:
-            url = QUrl(None)
+            media = QMediaContent(QUrl(None))
+            self.audio.setMedia(media)
+        elif self.stream_audio:
+            # Stream straight from the input file, the URL is only a hint about the format
+            self.audio_stream = WaveStream(self.bw)
+            media = QMediaContent(QUrl.fromLocalFile(self.bw.audio_filename))
+            self.audio.setMedia(media, self.audio_stream)
         else:
-            url = QUrl.fromLocalFile(self.bw.audio_filename)
-        media = QMediaContent(url)
-        self.audio.setMedia(media)
+            media = QMediaContent(QUrl.fromLocalFile(self.bw.get_audio_file()))
+            self.audio.setMedia(media)
 
-    def open_file(self, filename):
-        self.close_file()
+        if old_stream is not None:
+            old_stream.close()
 
-        self.bw.change_filename(filename)
+    # Whether a temporary WAV file still has to be computed before the audio can be loaded
+    def needs_audio_file(self):
+        if self.bw.filename is None or self.stream_audio:
+            return False
+        else:
+            return not self.bw.audio_file_exists()
 
+    def load_audio(self):
         self.set_audio_file(self.bw.audio_filename)
 
+    # Show the first frame of a newly opened file (the audio can be loaded later)
+    def show_file(self):
         self.set_image_timestamp(self.get_position())
 
     def close_file(self):
@@ -236,232 +378,16 @@ class Player:
         else:
             return False
 
+    @tracing.traced("player.frame")
     def set_image_timestamp(self, ms):
         if self.bw.filename is None:
             self.clear_image()
         else:
-            self.set_image(self.bw.get_frame_qimage(ms))
+            self.set_frame_image(self.frame_renderer.get_frame_qimage(ms, flip=False))
 
     def update_image(self):
+        # Anything prefetched was made with the old settings
+        self.frame_scheduler.reset()
+
         ms = self.get_position()
         self.set_image_timestamp(ms)
-
-    def set_audio_settings(self,
-                           num_channels,
-                           sample_bytes,
-                           sample_rate,
-                           volume
-                           ):
-        self.bw.set_audio_settings(
-            num_channels=num_channels,
-            sample_bytes=sample_bytes,
-            sample_rate=sample_rate,
-            volume=volume
-        )
-        # Re-open newly computed file
-        self.set_audio_file(None)
-        self.set_audio_file(self.bw.audio_filename)
-
-
-# Renderer class
-#   Provides an abstraction for rendering images, audio, and video to files
-class Renderer:
-    def __init__(self,
-                 binary_waterfall,
-                 ):
-        self.bw = binary_waterfall
-
-    def export_frame(self,
-                     ms,
-                     filename,
-                     size=None,
-                     keep_aspect=False
-                     ):
-        helpers.make_file_path(filename)
-
-        if self.bw.audio_filename is None:
-            # If no file is loaded, make a black image
-            source = Image.new(
-                mode="RGBA",
-                size=(self.bw.width, self.bw.height),
-                color="#000"
-            )
-        else:
-            source = self.bw.get_frame_image(ms).convert("RGBA")
-
-        # Resize with aspect ratio, paste onto black
-        if size is None:
-            resized = source
-        else:
-            if keep_aspect:
-                output_size = helpers.get_size_for_fit_frame(content_size=source.size, frame_size=size)["size"]
-            else:
-                output_size = size
-
-            resized = helpers.fit_to_frame(
-                image=source,
-                frame_size=output_size,
-                scaling=Image.NEAREST,
-                transparent=False
-            )
-
-        final = resized.convert("RGB")
-
-        final.save(filename)
-
-    def export_audio(self, filename):
-        filename_main, filename_ext = os.path.splitext(filename)
-        filename_ext = filename_ext.lower()
-
-        helpers.make_file_path(filename)
-
-        if filename_ext == constants.AudioFormatCode.WAVE.value:
-            # Just copy the .wav file
-            shutil.copy(self.bw.audio_filename, filename)
-        elif filename_ext == constants.AudioFormatCode.MP3.value:
-            # Use Pydub to export MP3
-            pydub.AudioSegment.from_wav(self.bw.audio_filename).export(filename, format="mp3")
-        elif filename_ext == constants.AudioFormatCode.FLAC.value:
-            # Use Pydub to export FLAC
-            pydub.AudioSegment.from_wav(self.bw.audio_filename).export(filename, format="flac")
-
-    def get_frame_count(self, fps):
-        audio_duration = self.bw.get_audio_length() / 1000
-        frame_count = round(audio_duration * fps)
-
-        return frame_count
-
-    def export_sequence(self,
-                        directory,
-                        fps,
-                        size=None,
-                        keep_aspect=False,
-                        image_format=None,
-                        progress_dialog=None
-                        ):
-        helpers.make_file_path(directory)
-
-        frame_count = self.get_frame_count(fps)
-
-        frame_number_digits = len(str(frame_count))
-
-        if image_format is None:
-            image_format = constants.ImageFormatCode.PNG
-
-        for frame in range(frame_count):
-            frame_number = str(frame).rjust(frame_number_digits, "0")
-            frame_filename = os.path.join(directory, f"{frame_number}{image_format.value}")
-            frame_ms = round((frame / fps) * 1000)
-
-            if progress_dialog is not None:
-                progress_dialog.setValue(frame)
-
-                if progress_dialog.wasCanceled():
-                    return
-
-            self.export_frame(
-                ms=frame_ms,
-                filename=frame_filename,
-                size=size,
-                keep_aspect=keep_aspect
-            )
-
-        if progress_dialog is not None:
-            progress_dialog.setValue(frame_count)
-
-    def export_video(self,
-                     filename,
-                     fps,
-                     size=None,
-                     keep_aspect=False,
-                     progress_dialog=None,
-                     codec=None,
-                     audio_codec=None,
-                     bitrate=None,
-                     audio_bitrate=None,
-                     preset=None
-                     ):
-        # Get temporary directory
-        temp_dir = tempfile.mkdtemp()
-
-        # Make file names
-        image_dir = os.path.join(temp_dir, "images")
-        audio_file = os.path.join(temp_dir, "audio.wav")
-        filename_main, filename_ext = os.path.splitext(filename)
-        filename_path, filename_title = os.path.split(filename)
-        video_file = os.path.join(temp_dir, f"video{filename_ext}")
-
-        # Set progress dialog to not close when at max
-        if progress_dialog is not None:
-            progress_dialog.setAutoReset(False)
-
-        # Export image sequence
-        self.export_sequence(
-            directory=image_dir,
-            fps=fps,
-            size=size,
-            keep_aspect=keep_aspect,
-            image_format=constants.ImageFormatCode.PNG,
-            progress_dialog=progress_dialog
-        )
-
-        if progress_dialog is not None:
-            if progress_dialog.wasCanceled():
-                shutil.rmtree(temp_dir)
-                return
-            progress_dialog.setLabelText("Splicing final video file... (program may lag)")
-
-        # Export audio
-        self.export_audio(audio_file)
-
-        # Prepare the custom logger to update the progress box
-        if progress_dialog is not None:
-            custom_logger = helpers.QtBarLoggerMoviepy(progress_dialog=progress_dialog)
-        else:
-            custom_logger = "bar"
-
-        # Make a list of the image filenames
-        frames_list = list()
-        for frame_filename in os.listdir(image_dir):
-            full_frame_filename = os.path.join(image_dir, frame_filename)
-            frames_list.append(full_frame_filename)
-
-        # Merge image sequence and audio into final video
-        sequence_clip = ImageSequenceClip(frames_list, fps=fps)
-        audio_clip = AudioFileClip(audio_file)
-
-        video_clip = sequence_clip.set_audio(audio_clip)
-        # TODO: Control quality settings
-        # TODO: Set temp audio file location if possible
-        video_clip.write_videofile(
-            filename=video_file,
-            codec=codec,
-            bitrate=bitrate,
-            audio_codec=audio_codec,
-            audio_bitrate=audio_bitrate,
-            preset=preset,
-            threads=None,
-            logger=custom_logger,
-            temp_audiofile=None
-        )
-
-        if progress_dialog is not None:
-            if progress_dialog.wasCanceled():
-                shutil.rmtree(temp_dir)
-                return
-
-            # Reset progress dialog and set to exit on completion
-            progress_dialog.setLabelText("Wrapping up...")
-            progress_dialog.setValue(0)
-            progress_dialog.setMaximum(100)
-            progress_dialog.setAutoReset(True)
-
-        # Move video to final location
-        os.makedirs(filename_path, exist_ok=True)
-        shutil.move(video_file, filename)
-
-        # Delete temporary files
-        shutil.rmtree(temp_dir)
-
-        if progress_dialog is not None:
-            progress_dialog.setValue(100)
@@ -0,0 +1,851 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+import concurrent.futures
+import numpy as np
+from PIL import Image
+
+from . import generators, helpers, constants, tracing
+
+
+# Renderer class
+#   Provides an abstraction for rendering images, audio, and video to files
+class Renderer:
+    def __init__(self,
+                 binary_waterfall,
+                 ):
+        self.bw = binary_waterfall
+        # Sequences and videos export consecutive frames, which only scroll by a few rows
+        self.frame_renderer = generators.RollingRenderer(self.bw)
+
+    # The final (resized) RGB PIL Image for a frame, as it gets exported
+    @tracing.traced("export.image")
+    def get_export_image(self,
+                         ms,
+                         size=None,
+                         keep_aspect=False
+                         ):
+        if self.bw.audio_filename is None:
+            # If no file is loaded, make a black image
+            source = Image.new(
+                mode="RGBA",
+                size=(self.bw.width, self.bw.height),
+                color="#000"
+            )
+        else:
+            with tracing.span("export.render"):
+                source = self.frame_renderer.get_frame_image(ms).convert("RGBA")
+
+        # Resize with aspect ratio, paste onto black
+        if size is None:
+            resized = source
+        else:
+            if keep_aspect:
+                output_size = helpers.get_size_for_fit_frame(content_size=source.size, frame_size=size)["size"]
+            else:
+                output_size = size
+
+            with tracing.span("export.scale"):
+                resized = helpers.fit_to_frame(
+                    image=source,
+                    frame_size=output_size,
+                    scaling=Image.NEAREST,
+                    transparent=False
+                )
+
+        final = resized.convert("RGB")
+
+        return final
+
+    @tracing.traced("export.frame")
+    def export_frame(self,
+                     ms,
+                     filename,
+                     size=None,
+                     keep_aspect=False
+                     ):
+        helpers.make_file_path(filename)
+
+        final = self.get_export_image(
+            ms=ms,
+            size=size,
+            keep_aspect=keep_aspect
+        )
+
+        with tracing.span("export.save"):
+            final.save(filename)
+
+    @tracing.traced("export.audio")
+    def export_audio(self, filename):
+        import pydub
+
+        filename_main, filename_ext = os.path.splitext(filename)
+        filename_ext = filename_ext.lower()
+
+        helpers.make_file_path(filename)
+
+        if filename_ext == constants.AudioFormatCode.WAVE.value:
+            # Write the .wav file straight from the input file
+            self.bw.write_audio(filename)
+        elif filename_ext == constants.AudioFormatCode.MP3.value:
+            # Use Pydub to export MP3
+            audio_file = self.bw.get_audio_file()
+            with tracing.span("export.audio_encode"):
+                pydub.AudioSegment.from_wav(audio_file).export(filename, format="mp3")
+        elif filename_ext == constants.AudioFormatCode.FLAC.value:
+            # Use Pydub to export FLAC
+            audio_file = self.bw.get_audio_file()
+            with tracing.span("export.audio_encode"):
+                pydub.AudioSegment.from_wav(audio_file).export(filename, format="flac")
+
+    # The size the player shows the visualization at (the default export size)
+    def get_default_export_size(self, max_dim=constants.DEFAULTS["max_dim"]):
+        if self.bw.width > self.bw.height:
+            width = round(max_dim)
+            height = round(width * (self.bw.height / self.bw.width))
+        else:
+            height = round(max_dim)
+            width = round(height * (self.bw.width / self.bw.height))
+
+        return width, height
+
+    # The default video codec for a video file name (the same as the encoder settings dialog)
+    @staticmethod
+    def get_default_video_codec(filename):
+        filename_main, filename_ext = os.path.splitext(filename)
+        video_format = constants.VideoFormatCode(filename_ext.lower())
+
+        if video_format == constants.VideoFormatCode.AVI:
+            return constants.VideoCodecCode.PNG
+        else:
+            return constants.VideoCodecCode.LIBX264
+
+    def get_frame_count(self, fps):
+        audio_duration = self.bw.audio_length_ms / 1000
+        frame_count = round(audio_duration * fps)
+
+        return frame_count
+
+    @staticmethod
+    def get_frame_filename(directory, frame, frame_count, image_format):
+        frame_number_digits = len(str(frame_count))
+        frame_number = str(frame).rjust(frame_number_digits, "0")
+
+        return os.path.join(directory, f"{frame_number}{image_format.value}")
+
+    @staticmethod
+    def get_frame_ms(frame, fps):
+        return round((frame / fps) * 1000)
+
+    @tracing.traced("export.sequence")
+    def export_sequence(self,
+                        directory,
+                        fps,
+                        size=None,
+                        keep_aspect=False,
+                        image_format=None,
+                        progress_dialog=None,
+                        workers=None,
+                        frames=None
+                        ):
+        helpers.make_file_path(directory)
+
+        frame_count = self.get_frame_count(fps)
+
+        # Only export some of the frames (a shard), they are named as if the whole sequence was exported
+        if frames is None:
+            frames = range(frame_count)
+
+        if image_format is None:
+            image_format = constants.ImageFormatCode.PNG
+
+        if workers is not None and workers > 1 and len(frames) > 1:
+            self.export_sequence_parallel(
+                directory=directory,
+                fps=fps,
+                frame_count=frame_count,
+                size=size,
+                keep_aspect=keep_aspect,
+                image_format=image_format,
+                progress_dialog=progress_dialog,
+                workers=workers,
+                frames=frames
+            )
+            return
+
+        for idx, frame in enumerate(frames):
+            if progress_dialog is not None:
+                progress_dialog.setValue(idx)
+
+                if progress_dialog.wasCanceled():
+                    return
+
+            self.export_frame(
+                ms=self.get_frame_ms(frame, fps),
+                filename=self.get_frame_filename(directory, frame, frame_count, image_format),
+                size=size,
+                keep_aspect=keep_aspect
+            )
+
+        if progress_dialog is not None:
+            progress_dialog.setValue(len(frames))
+
+    # Export an image sequence on a pool of worker processes
+    #   The frames are split into runs of consecutive frames (so each worker can scroll
+    #   instead of re-rendering), and progress is reported in frame order
+    @tracing.traced("export.sequence_parallel")
+    def export_sequence_parallel(self,
+                                 directory,
+                                 fps,
+                                 frame_count,
+                                 size,
+                                 keep_aspect,
+                                 image_format,
+                                 progress_dialog,
+                                 workers,
+                                 frames
+                                 ):
+        chunk_frames = constants.DEFAULTS["export_chunk_frames"]
+        chunks = [frames[start:start + chunk_frames] for start in range(0, len(frames), chunk_frames)]
+
+        settings = self.bw.get_settings()
+
+        # Spawn (not fork) the workers, forking a process that is running Qt isn't safe
+        mp_context = multiprocessing.get_context("spawn")
+        cancel_event = mp_context.Event()
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            mp_context=mp_context,
+            initializer=init_export_worker,
+            initargs=(cancel_event,)
+        )
+        try:
+            futures = [
+                executor.submit(
+                    export_sequence_frames,
+                    settings=settings,
+                    frames=chunk,
+                    directory=directory,
+                    fps=fps,
+                    frame_count=frame_count,
+                    size=size,
+                    keep_aspect=keep_aspect,
+                    image_format=image_format
+                ) for chunk in chunks
+            ]
+
+            done_chunks = 0
+            done_frames = 0
+            while done_chunks < len(futures):
+                concurrent.futures.wait(
+                    futures[done_chunks:],
+                    timeout=0.1,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                # Only count the chunks that are done in order
+                while done_chunks < len(futures) and futures[done_chunks].done():
+                    # Raises any error from the worker
+                    futures[done_chunks].result()
+                    done_frames += len(chunks[done_chunks])
+                    done_chunks += 1
+
+                if progress_dialog is not None:
+                    progress_dialog.setValue(done_frames)
+
+                    if progress_dialog.wasCanceled():
+                        return
+        finally:
+            # Stop the running chunks and drop anything that hasn't started yet (only matters on cancel or error)
+            cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # A moviepy VideoClip of a run of frames
+    #   Frames are rendered as the encoder asks for them and piped straight in, nothing goes to disk
+    def make_video_clip(self, frames, fps, size=None, keep_aspect=False):
+        from moviepy.video.VideoClip import VideoClip
+
+        def make_frame(t):
+            frame = frames[min(round(t * fps), len(frames) - 1)]
+            image = self.get_export_image(
+                ms=self.get_frame_ms(frame, fps),
+                size=size,
+                keep_aspect=keep_aspect
+            )
+
+            return np.asarray(image)
+
+        return VideoClip(make_frame, duration=len(frames) / fps)
+
+    @tracing.traced("export.video")
+    def export_video(self,
+                     filename,
+                     fps,
+                     size=None,
+                     keep_aspect=False,
+                     progress_dialog=None,
+                     codec=None,
+                     audio_codec=None,
+                     bitrate=None,
+                     audio_bitrate=None,
+                     preset=None,
+                     segments=None,
+                     segment_threads=None,
+                     logger="bar"
+                     ):
+        from moviepy.audio.io.AudioFileClip import AudioFileClip
+
+        # Get temporary directory
+        temp_dir = tempfile.mkdtemp()
+
+        # Delete the temporary files (with any partial segments or video) however the export ends
+        try:
+            # Make file names
+            filename_main, filename_ext = os.path.splitext(filename)
+            filename_path, filename_title = os.path.split(filename)
+            video_file = os.path.join(temp_dir, f"video{filename_ext}")
+
+            # Set progress dialog to not close when at max
+            if progress_dialog is not None:
+                progress_dialog.setAutoReset(False)
+
+            # Get the audio (made now if it doesn't exist yet)
+            with tracing.span("export.video_audio"):
+                audio_file = self.bw.get_audio_file()
+
+            frame_count = self.get_frame_count(fps)
+
+            if segments is not None and segments > 1 and frame_count > 1:
+                completed = self.export_video_segmented(
+                    video_file=video_file,
+                    audio_file=audio_file,
+                    temp_dir=temp_dir,
+                    fps=fps,
+                    frame_count=frame_count,
+                    size=size,
+                    keep_aspect=keep_aspect,
+                    progress_dialog=progress_dialog,
+                    codec=codec,
+                    audio_codec=audio_codec,
+                    bitrate=bitrate,
+                    audio_bitrate=audio_bitrate,
+                    preset=preset,
+                    segments=segments,
+                    segment_threads=segment_threads,
+                    logger=logger
+                )
+                if not completed:
+                    return
+            else:
+                # Prepare the custom logger to update the progress box (and stop the export if it's canceled)
+                if progress_dialog is not None:
+                    custom_logger = helpers.QtBarLoggerMoviepy(progress_dialog=progress_dialog)
+                else:
+                    custom_logger = logger
+
+                # Merge frames and audio into final video
+                audio_clip = AudioFileClip(audio_file)
+                video_clip = self.make_video_clip(
+                    frames=range(frame_count),
+                    fps=fps,
+                    size=size,
+                    keep_aspect=keep_aspect
+                ).set_audio(audio_clip)
+                # TODO: Control quality settings
+                # TODO: Set temp audio file location if possible
+                try:
+                    # Includes rendering each frame (export.image), moviepy asks for them as it encodes
+                    with tracing.span("export.video_encode"):
+                        video_clip.write_videofile(
+                            filename=video_file,
+                            fps=fps,
+                            codec=codec,
+                            bitrate=bitrate,
+                            audio_codec=audio_codec,
+                            audio_bitrate=audio_bitrate,
+                            preset=preset,
+                            threads=None,
+                            logger=custom_logger,
+                            temp_audiofile=None
+                        )
+                except helpers.ExportCanceled:
+                    return
+                finally:
+                    video_clip.close()
+                    audio_clip.close()
+
+            if progress_dialog is not None:
+                # Reset progress dialog and set to exit on completion
+                progress_dialog.setLabelText("Wrapping up...")
+                progress_dialog.setValue(0)
+                progress_dialog.setMaximum(100)
+                progress_dialog.setAutoReset(True)
+
+            # Move video to final location
+            if filename_path != "":
+                os.makedirs(filename_path, exist_ok=True)
+            shutil.move(video_file, filename)
+
+            if progress_dialog is not None:
+                progress_dialog.setValue(100)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Encode the video as segments on a pool of worker processes, then join them
+    #   Every segment starts with a fresh encoder (so on a keyframe), which lets ffmpeg's concat
+    #   demuxer join them without re-encoding. The audio is muxed in once, at the end.
+    #   Returns False if it was canceled
+    @tracing.traced("export.video_segments")
+    def export_video_segmented(self,
+                               video_file,
+                               audio_file,
+                               temp_dir,
+                               fps,
+                               frame_count,
+                               size,
+                               keep_aspect,
+                               progress_dialog,
+                               codec,
+                               audio_codec,
+                               bitrate,
+                               audio_bitrate,
+                               preset,
+                               segments,
+                               segment_threads,
+                               logger="bar"
+                               ):
+        import proglog
+
+        filename_main, filename_ext = os.path.splitext(video_file)
+
+        # Same defaults as moviepy's write_videofile
+        if codec is None:
+            import moviepy.tools
+            codec = moviepy.tools.extensions_dict[filename_ext[1:].lower()]["codec"][0]
+        if preset is None:
+            preset = "medium"
+
+        frame_ranges = helpers.split_frame_range(frame_count, segments)
+        segment_files = [os.path.join(temp_dir, f"segment{idx}{filename_ext}") for idx in range(len(frame_ranges))]
+
+        if progress_dialog is not None:
+            progress_dialog.setLabelText("Rendering video segments...")
+            progress_dialog.setMaximum(frame_count)
+            progress_dialog.setValue(0)
+            bar_logger = None
+        else:
+            # A moviepy-style logger ("bar" or None for silence), like the single-process path takes
+            bar_logger = proglog.default_bar_logger(logger)
+            bar_logger(message="Rendering video segments...")
+            bar_logger(t__total=frame_count)
+            bar_frames = 0
+
+        settings = self.bw.get_settings()
+
+        # Spawn (not fork) the workers, forking a process that is running Qt isn't safe
+        mp_context = multiprocessing.get_context("spawn")
+        cancel_event = mp_context.Event()
+        frame_counter = mp_context.Value("q", 0)
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=len(frame_ranges),
+            mp_context=mp_context,
+            initializer=init_export_worker,
+            initargs=(cancel_event, frame_counter)
+        )
+        try:
+            futures = [
+                executor.submit(
+                    export_video_segment,
+                    settings=settings,
+                    frames=frames,
+                    filename=segment_file,
+                    fps=fps,
+                    size=size,
+                    keep_aspect=keep_aspect,
+                    codec=codec,
+                    bitrate=bitrate,
+                    preset=preset,
+                    threads=segment_threads
+                ) for frames, segment_file in zip(frame_ranges, segment_files)
+            ]
+
+            not_done = futures
+            while len(not_done) > 0:
+                done, not_done = concurrent.futures.wait(
+                    not_done,
+                    timeout=0.1,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    # Raises any error from the worker
+                    future.result()
+
+                if progress_dialog is not None:
+                    progress_dialog.setValue(frame_counter.value)
+
+                    if progress_dialog.wasCanceled():
+                        return False
+                elif frame_counter.value != bar_frames:
+                    # Only when it moves, a finished bar would be opened again
+                    bar_frames = frame_counter.value
+                    bar_logger(t__index=bar_frames)
+        finally:
+            # Stop the running segments and drop anything that hasn't started yet (only matters on cancel or error)
+            cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if progress_dialog is not None:
+            progress_dialog.setLabelText("Joining video segments...")
+
+        self.join_video_segments(
+            segment_files=segment_files,
+            audio_file=audio_file,
+            video_file=video_file,
+            temp_dir=temp_dir,
+            audio_codec=audio_codec,
+            audio_bitrate=audio_bitrate
+        )
+
+        return True
+
+    # Join silent video segments (all encoded the same way) without re-encoding, and mux in the audio
+    @staticmethod
+    @tracing.traced("export.video_join")
+    def join_video_segments(segment_files, audio_file, video_file, temp_dir, audio_codec=None, audio_bitrate=None):
+        import moviepy.config
+
+        filename_main, filename_ext = os.path.splitext(video_file)
+
+        # Same default audio codec as moviepy
+        if audio_codec is None:
+            if filename_ext.lower() in [".ogv", ".webm"]:
+                audio_codec = "libvorbis"
+            else:
+                audio_codec = "libmp3lame"
+
+        segment_list_file = os.path.join(temp_dir, "segments.txt")
+        with open(segment_list_file, "w") as f:
+            for segment_file in segment_files:
+                segment_file = segment_file.replace("'", "'\\''")
+                f.write(f"file '{segment_file}'\n")
+
+        command = [
+            moviepy.config.get_setting("FFMPEG_BINARY"),
+            "-y",
+            "-loglevel", "error",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", segment_list_file,
+            "-i", audio_file,
+            "-map", "0:v:0",
+            "-map", "1:a:0",
+            "-c:v", "copy",
+            "-c:a", audio_codec,
+            # moviepy always writes 44.1kHz stereo audio
+            "-ar", "44100",
+            "-ac", "2"
+        ]
+        # moviepy's default bitrate is None too (ffmpeg picks it, the same way for the same stereo stream)
+        if audio_bitrate is not None:
+            command += ["-b:a", audio_bitrate]
+        command.append(video_file)
+
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(f"Joining the video segments failed: {result.stderr.decode(errors='replace').strip()}")
+
+    # The file name of one shard of an export (shard is counted from 1)
+    #   Shard info files go next to (or, for image sequences, inside) the export
+    @staticmethod
+    def get_shard_filename(filename, shard, shard_count, extension):
+        return f"{filename}.shard{shard}of{shard_count}{extension}"
+
+    def get_shard_info(self, fps, shard, shard_count, frames, frame_count):
+        settings = self.bw.get_settings()
+        settings.pop("filename")
+        settings["alignment"] = settings["alignment"].name
+
+        result = dict()
+        result["shard"] = shard
+        result["shard_count"] = shard_count
+        result["start"] = frames.start
+        result["stop"] = frames.stop
+        result["frame_count"] = frame_count
+        result["fps"] = fps
+        result["total_bytes"] = self.bw.total_bytes
+        result["settings"] = settings
+
+        return result
+
+    def write_shard_info(self, filename, info):
+        helpers.make_file_path(filename)
+        with open(filename, "w") as f:
+            json.dump(info, f, indent=2)
+
+    # Read every shard's info and check that together they make up the whole export
+    def read_shard_infos(self, shard_filenames):
+        if len(shard_filenames) < 1:
+            raise ValueError("There must be at least 1 shard")
+
+        infos = list()
+        for shard, filename in enumerate(shard_filenames, start=1):
+            if not os.path.isfile(filename):
+                raise ValueError(f"Shard {shard} of {len(shard_filenames)} is missing (no \"{filename}\")")
+
+            with open(filename, "r") as f:
+                infos.append(json.load(f))
+
+        for key in ["shard_count", "total_bytes", "settings", "fps", "frame_count"]:
+            if any(info[key] != infos[0][key] for info in infos):
+                raise ValueError(f"The shards don't match each other ({key} differs)")
+
+        if infos[0]["shard_count"] != len(shard_filenames):
+            raise ValueError(f"The shards were made for {infos[0]['shard_count']} shards, not {len(shard_filenames)}")
+
+        if self.bw.total_bytes is not None and infos[0]["total_bytes"] != self.bw.total_bytes:
+            raise ValueError("The shards were made from a different input file")
+
+        # The shards must cover the frames in order, with no gaps or overlaps
+        next_frame = 0
+        for shard, info in enumerate(infos, start=1):
+            if info["shard"] != shard or info["start"] != next_frame:
+                raise ValueError(f"Shard {shard} of {len(infos)} doesn't cover the right frames")
+            next_frame = info["stop"]
+        if next_frame != infos[0]["frame_count"]:
+            raise ValueError("The shards don't cover every frame")
+
+        return infos
+
+    # Export one shard of an image sequence, every shard writes into the same directory
+    @tracing.traced("export.sequence_shard")
+    def export_sequence_shard(self,
+                              directory,
+                              fps,
+                              shard,
+                              shard_count,
+                              size=None,
+                              keep_aspect=False,
+                              image_format=None,
+                              progress_dialog=None,
+                              workers=None
+                              ):
+        frame_count = self.get_frame_count(fps)
+        frames = helpers.get_shard_range(frame_count, shard - 1, shard_count)
+
+        self.export_sequence(
+            directory=directory,
+            fps=fps,
+            size=size,
+            keep_aspect=keep_aspect,
+            image_format=image_format,
+            progress_dialog=progress_dialog,
+            workers=workers,
+            frames=frames
+        )
+
+        if progress_dialog is not None and progress_dialog.wasCanceled():
+            return
+
+        self.write_shard_info(
+            self.get_shard_filename(os.path.join(directory, ""), shard, shard_count, ".json"),
+            self.get_shard_info(fps, shard, shard_count, frames, frame_count)
+        )
+
+    # Check every shard of an image sequence is there, and clean up the shard info files
+    @tracing.traced("export.merge_sequence")
+    def merge_sequence_shards(self, directory, shard_count, image_format=None):
+        if image_format is None:
+            image_format = constants.ImageFormatCode.PNG
+
+        info_filenames = [
+            self.get_shard_filename(os.path.join(directory, ""), shard, shard_count, ".json")
+            for shard in range(1, shard_count + 1)
+        ]
+        infos = self.read_shard_infos(info_filenames)
+
+        frame_count = infos[0]["frame_count"]
+        for frame in range(frame_count):
+            frame_filename = self.get_frame_filename(directory, frame, frame_count, image_format)
+            if not os.path.isfile(frame_filename):
+                raise ValueError(f"Frame {frame} is missing (no \"{frame_filename}\")")
+
+        for info_filename in info_filenames:
+            os.remove(info_filename)
+
+    # Export one shard of a video, as a silent video file next to the final one
+    @tracing.traced("export.video_shard")
+    def export_video_shard(self,
+                           filename,
+                           fps,
+                           shard,
+                           shard_count,
+                           size=None,
+                           keep_aspect=False,
+                           codec=None,
+                           bitrate=None,
+                           preset=None,
+                           threads=None
+                           ):
+        filename_main, filename_ext = os.path.splitext(filename)
+        frame_count = self.get_frame_count(fps)
+        frames = helpers.get_shard_range(frame_count, shard - 1, shard_count)
+
+        # Same defaults as moviepy's write_videofile
+        if codec is None:
+            import moviepy.tools
+            codec = moviepy.tools.extensions_dict[filename_ext[1:].lower()]["codec"][0]
+        if preset is None:
+            preset = "medium"
+
+        shard_filename = self.get_shard_filename(filename_main, shard, shard_count, filename_ext)
+        helpers.make_file_path(shard_filename)
+
+        if len(frames) > 0:
+            export_video_segment(
+                settings=self.bw.get_settings(),
+                frames=frames,
+                filename=shard_filename,
+                fps=fps,
+                size=size,
+                keep_aspect=keep_aspect,
+                codec=codec,
+                bitrate=bitrate,
+                preset=preset,
+                threads=threads
+            )
+
+        info = self.get_shard_info(fps, shard, shard_count, frames, frame_count)
+        info["codec"] = codec
+        self.write_shard_info(self.get_shard_filename(filename_main, shard, shard_count, ".json"), info)
+
+    # Check every shard of a video is there, join them, and mux in the audio
+    @tracing.traced("export.merge_video")
+    def merge_video_shards(self, filename, shard_count, audio_codec=None, audio_bitrate=None, keep_shards=False):
+        filename_main, filename_ext = os.path.splitext(filename)
+        info_filenames = [
+            self.get_shard_filename(filename_main, shard, shard_count, ".json")
+            for shard in range(1, shard_count + 1)
+        ]
+        infos = self.read_shard_infos(info_filenames)
+
+        if any(info["codec"] != infos[0]["codec"] for info in infos):
+            raise ValueError("The shards weren't all encoded with the same codec")
+
+        # The audio is made with the same settings the shards were
+        settings = infos[0]["settings"]
+        self.bw.set_audio_settings(
+            num_channels=settings["num_channels"],
+            sample_bytes=settings["sample_bytes"],
+            sample_rate=settings["sample_rate"],
+            volume=settings["volume"]
+        )
+
+        # Shards with no frames (more shards than frames) don't have a file
+        segment_files = list()
+        for shard, info in enumerate(infos, start=1):
+            if info["stop"] > info["start"]:
+                segment_file = self.get_shard_filename(filename_main, shard, shard_count, filename_ext)
+                if not os.path.isfile(segment_file):
+                    raise ValueError(f"Shard {shard} of {shard_count} is missing (no \"{segment_file}\")")
+                segment_files.append(segment_file)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            video_file = os.path.join(temp_dir, f"video{filename_ext}")
+            self.join_video_segments(
+                segment_files=segment_files,
+                audio_file=self.bw.get_audio_file(),
+                video_file=video_file,
+                temp_dir=temp_dir,
+                audio_codec=audio_codec,
+                audio_bitrate=audio_bitrate
+            )
+
+            helpers.make_file_path(filename)
+            shutil.move(video_file, filename)
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        if not keep_shards:
+            for segment_file in segment_files + info_filenames:
+                os.remove(segment_file)
+
+
+# Set in each export worker process, lets the parent stop work that is in progress
+export_cancel_event = None
+# Set in each export worker process (if the parent wants it), a shared count of rendered frames
+export_frame_counter = None
+
+
+def init_export_worker(cancel_event, frame_counter=None):
+    global export_cancel_event, export_frame_counter
+    export_cancel_event = cancel_event
+    export_frame_counter = frame_counter
+
+
+# Render a run of image sequence frames (used by worker processes)
+#   Each call opens its own read-only view of the input file from a settings snapshot
+def export_sequence_frames(settings, frames, directory, fps, frame_count, size, keep_aspect, image_format):
+    renderer = Renderer(binary_waterfall=generators.BinaryWaterfall(**settings))
+
+    try:
+        for frame in frames:
+            if export_cancel_event is not None and export_cancel_event.is_set():
+                break
+
+            renderer.export_frame(
+                ms=renderer.get_frame_ms(frame, fps),
+                filename=renderer.get_frame_filename(directory, frame, frame_count, image_format),
+                size=size,
+                keep_aspect=keep_aspect
+            )
+    finally:
+        renderer.bw.cleanup()
+
+    return len(frames)
+
+
+# Encode a run of frames as a silent video file (used by worker processes)
+#   The frames are written one by one (not through a clip's timeline) so the segment has exactly len(frames) frames
+def export_video_segment(settings, frames, filename, fps, size, keep_aspect, codec, bitrate, preset, threads):
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    renderer = Renderer(binary_waterfall=generators.BinaryWaterfall(**settings))
+
+    writer = None
+    try:
+        for frame in frames:
+            if export_cancel_event is not None and export_cancel_event.is_set():
+                return False
+
+            image = renderer.get_export_image(
+                ms=renderer.get_frame_ms(frame, fps),
+                size=size,
+                keep_aspect=keep_aspect
+            )
+
+            if writer is None:
+                writer = FFMPEG_VideoWriter(
+                    filename,
+                    image.size,
+                    fps,
+                    codec=codec,
+                    preset=preset,
+                    bitrate=bitrate,
+                    threads=threads
+                )
+
+            writer.write_frame(np.asarray(image))
+
+            if export_frame_counter is not None:
+                with export_frame_counter.get_lock():
+                    export_frame_counter.value += 1
+    finally:
+        if writer is not None:
+            writer.close()
+        renderer.bw.cleanup()
+
+    return True
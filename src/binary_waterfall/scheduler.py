@@ -0,0 +1,247 @@
+import time
+import threading
+
+from . import constants, tracing
+
+# How much each new render time counts towards the average
+RENDER_TIME_WEIGHT = 0.2
+
+
+# Frame scheduler class
+#   Renders the frames the player is about to show ahead of time, on a background thread.
+#   The playback clock is anchored to the audio position (each time the audio reports it) and
+#   runs on in between, so the timestamps of the next few display ticks can be predicted and
+#   their frames rendered into a small queue. Each display tick takes the queued frame closest
+#   to the clock. Frames that were passed over are dropped instead of being shown late, and if
+#   nothing is ready the tick is counted as late (the last frame stays up)
+#   render_function(ms) makes a frame, and reset_function() (if given) is called on the render
+#   thread before the first frame after a reset, so it can drop any state from the old settings
+class FrameScheduler:
+    def __init__(self,
+                 render_function,
+                 frame_ms,
+                 reset_function=None,
+                 queue_size=constants.DEFAULTS["player_prefetch_frames"],
+                 clock=time.perf_counter
+                 ):
+        if queue_size < 1:
+            raise ValueError("Must prefetch at least 1 frame")
+
+        self.render_function = render_function
+        self.reset_function = reset_function
+        self.frame_ms = None
+        self.queue_size = queue_size
+        self.clock = clock
+        self.condition = threading.Condition()
+
+        # Timestamp (ms) -> rendered frame
+        self.frames = dict()
+        # Bumped whenever the queued frames go stale, frames rendered before that are thrown out
+        self.generation = 0
+        self.rendered_generation = None
+        self.rendering = False
+        # How long a frame takes to render (ms, a moving average), frames are rendered at least this far ahead
+        self.render_ms = 0
+        self.running = False
+        self.closed = False
+
+        # Where the audio was (ms), and when (clock seconds)
+        self.anchor_ms = 0
+        self.anchor_time = self.clock()
+
+        self.shown = 0
+        self.dropped = 0
+        self.late = 0
+        self.rendered = 0
+        self.failed = 0
+
+        self.set_frame_ms(frame_ms)
+
+        self.thread = threading.Thread(target=self.render_loop, name="FrameScheduler", daemon=True)
+        self.thread.start()
+
+    def set_frame_ms(self, frame_ms):
+        if frame_ms <= 0:
+            raise ValueError("Frame time must be more than 0ms")
+
+        with self.condition:
+            self.frame_ms = frame_ms
+            self.condition.notify_all()
+
+    # The predicted playback position (ms), lock must be held
+    def get_clock_ms(self):
+        if not self.running:
+            return self.anchor_ms
+
+        return self.anchor_ms + (self.clock() - self.anchor_time) * 1000
+
+    def get_ms(self):
+        with self.condition:
+            return self.get_clock_ms()
+
+    def set_anchor(self, ms):
+        self.anchor_ms = ms
+        self.anchor_time = self.clock()
+
+    # Throw out the queued frames (and any frame being rendered), lock must be held
+    def clear_frames(self):
+        self.frames.clear()
+        self.generation += 1
+        self.condition.notify_all()
+
+    # Start predicting and prefetching from the audio position ms (playback started)
+    def start(self, ms):
+        with self.condition:
+            self.clear_frames()
+            self.set_anchor(ms)
+            self.running = True
+
+    # Stop prefetching (playback stopped), waits for the frame being rendered to finish,
+    # so the file and settings can be changed safely afterwards
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.clear_frames()
+            while self.rendering:
+                self.condition.wait()
+
+    # The audio reported its position
+    #   A jump further than the queue reaches (a seek) throws the queued frames out
+    def sync(self, ms):
+        with self.condition:
+            if abs(ms - self.get_clock_ms()) > (self.queue_size + 1) * self.frame_ms:
+                self.clear_frames()
+            self.set_anchor(ms)
+
+    # The settings changed, the queued frames are wrong now
+    def reset(self):
+        with self.condition:
+            self.clear_frames()
+
+    # Drop the queued frames from before ms, lock must be held
+    def drop_frames_before(self, ms):
+        for frame_ms in [x for x in self.frames if x < ms]:
+            del self.frames[frame_ms]
+            self.dropped += 1
+
+    # The next timestamp to render, or None if the queue is full (or we're stopped), lock must be held
+    def get_next_target(self):
+        if not self.running:
+            return None
+
+        now = self.get_clock_ms()
+        # Too old to ever be picked over a newer frame
+        self.drop_frames_before(now - self.frame_ms)
+
+        if len(self.frames) >= self.queue_size:
+            return None
+
+        for idx in range(1, self.queue_size + 1):
+            target = round(now + self.render_ms + idx * self.frame_ms)
+            if all(abs(target - x) > self.frame_ms / 2 for x in self.frames):
+                return target
+
+        return None
+
+    def render_loop(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        return
+
+                    ms = self.get_next_target()
+                    if ms is not None:
+                        break
+
+                    if self.running:
+                        # The clock moves on, so check again after a frame even if nothing changes
+                        self.condition.wait(timeout=self.frame_ms / 1000)
+                    else:
+                        self.condition.wait()
+
+                generation = self.generation
+                reset = generation != self.rendered_generation
+                self.rendered_generation = generation
+                self.rendering = True
+
+            try:
+                if reset and self.reset_function is not None:
+                    self.reset_function()
+
+                start_time = self.clock()
+                with tracing.span("player.prefetch"):
+                    frame = self.render_function(ms)
+                render_ms = (self.clock() - start_time) * 1000
+            except Exception:
+                # Settings can change while a frame renders, the frame is thrown out anyway
+                frame = None
+                failed = True
+            else:
+                failed = False
+
+            with self.condition:
+                self.rendering = False
+                if failed:
+                    self.failed += 1
+                    # Start clean on the next frame
+                    self.rendered_generation = None
+                else:
+                    self.render_ms += (render_ms - self.render_ms) * RENDER_TIME_WEIGHT
+                    if generation == self.generation:
+                        self.frames[ms] = frame
+                        self.rendered += 1
+                self.condition.notify_all()
+
+    # The frame to show now (None to keep showing the last one), called once per display tick
+    def next_frame(self):
+        with self.condition:
+            now = self.get_clock_ms()
+            self.drop_frames_before(now - self.frame_ms)
+
+            if len(self.frames) > 0:
+                best_ms = min(self.frames, key=lambda x: abs(x - now))
+            else:
+                best_ms = None
+
+            if best_ms is None or abs(best_ms - now) > self.frame_ms:
+                # Nothing was ready in time
+                self.late += 1
+                return None
+
+            self.drop_frames_before(best_ms)
+            frame = self.frames.pop(best_ms)
+            self.shown += 1
+            self.condition.notify_all()
+
+            return frame
+
+    # Frames shown, dropped (rendered but passed over), late (ticks with no frame ready),
+    # rendered, failed (errors while rendering) and queued
+    def get_stats(self):
+        with self.condition:
+            result = dict()
+            result["shown"] = self.shown
+            result["dropped"] = self.dropped
+            result["late"] = self.late
+            result["rendered"] = self.rendered
+            result["failed"] = self.failed
+            result["queued"] = len(self.frames)
+
+        return result
+
+    def reset_stats(self):
+        with self.condition:
+            self.shown = 0
+            self.dropped = 0
+            self.late = 0
+            self.rendered = 0
+            self.failed = 0
+
+    # Stop the render thread for good
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.closed = True
+            self.clear_frames()
+        self.thread.join()
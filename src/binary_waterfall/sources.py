@@ -0,0 +1,94 @@
+import os
+import mmap
+import threading
+import numpy as np
+
+
+# File source class
+#   Provides read-only access to an input file. The file is memory-mapped
+#   when possible so reads are zero-copy views into the page cache.
+#   Files that can't be mapped (empty files, some network filesystems)
+#   fall back to regular buffered reads.
+#   All reads are positional (nothing depends on a shared file cursor),
+#   so a single source can be read from any number of threads at once
+class FileSource:
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.map = None
+        self.view = None
+        self.lock = threading.Lock()
+
+        self.file = open(self.filename, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+
+        if self.size > 0:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                self.map = None
+            else:
+                self.view = memoryview(self.map)
+
+    def __del__(self):
+        self.close()
+
+    def is_mapped(self):
+        return self.view is not None
+
+    # Clip an address window to the bounds of the file
+    #   Bytes before the start of the file are skipped, and reads that run past the end are cut short
+    def clip(self, address, count):
+        start = min(max(address, 0), self.size)
+        end = min(max(address + count, start), self.size)
+
+        return start, end
+
+    # A memoryview (or bytes, if not mapped) of the requested window
+    def read(self, address, count):
+        start, end = self.clip(address, count)
+
+        if self.view is not None:
+            return self.view[start:end]
+
+        if start == end:
+            return b""
+
+        if hasattr(os, "pread"):
+            return self.pread(start, end - start)
+
+        # No positional reads on this platform (Windows), guard the file cursor instead
+        with self.lock:
+            self.file.seek(start)
+            return self.file.read(end - start)
+
+    def pread(self, address, count):
+        chunks = list()
+        while count > 0:
+            chunk = os.pread(self.file.fileno(), count, address)
+            if len(chunk) == 0:
+                break
+            chunks.append(chunk)
+            address += len(chunk)
+            count -= len(chunk)
+
+        return b"".join(chunks)
+
+    # A read-only 1D NumPy uint8 array of the requested window
+    def read_array(self, address, count):
+        return np.frombuffer(self.read(address, count), dtype=np.uint8)
+
+    def close(self):
+        if self.map is not None:
+            try:
+                self.view.release()
+                self.map.close()
+            except BufferError:
+                # A consumer still holds a view, the map is freed when it lets go
+                pass
+            self.view = None
+            self.map = None
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+
+# Opt-in timing of named spans (stages of rendering and exporting)
+#   Code marks a stage with "with tracing.span(name):" (or the @tracing.traced(name) decorator).
+#   Tracing is off unless enable() is called, and then span() just hands back a shared object that
+#   does nothing, so the spans can stay in hot paths. When it's on, every span's count, total and
+#   max time are kept, and (optionally) each span is recorded as a Chrome trace event
+#   (open the file in chrome://tracing or https://ui.perfetto.dev).
+#   Spans nest, so a span's total includes the spans inside it.
+
+# Set to a value like "summary" (print a summary on exit) or a file name ending in ".json"
+# (write a Chrome trace on exit) to trace any run, the GUI included
+ENVIRONMENT_VARIABLE = "BINARY_WATERFALL_TRACE"
+
+# Stop recording trace events after this many (the summary keeps counting), so a long run can't eat all the memory
+MAX_TRACE_EVENTS = 1000000
+
+# The tracer while tracing is on, None while it's off
+tracer = None
+
+
+# Tracer class
+#   Collects the timings of finished spans, from any thread
+class Tracer:
+    def __init__(self, record_events=False, max_events=MAX_TRACE_EVENTS):
+        self.record_events = record_events
+        self.max_events = max_events
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+
+        # Span name -> [count, total seconds, max seconds]
+        self.stats = dict()
+        self.events = list()
+        self.dropped_events = 0
+
+    def add(self, name, start_time, end_time):
+        duration = end_time - start_time
+
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                if duration > stats[2]:
+                    stats[2] = duration
+
+            if self.record_events:
+                if len(self.events) < self.max_events:
+                    self.events.append((name, start_time, duration, threading.get_ident()))
+                else:
+                    self.dropped_events += 1
+
+    # Span name -> count, total, max and mean (s), slowest total first
+    def get_summary(self):
+        with self.lock:
+            stats = sorted(self.stats.items(), key=lambda x: x[1][1], reverse=True)
+
+        result = dict()
+        for name, (count, total, maximum) in stats:
+            result[name] = {
+                "count": count,
+                "total": total,
+                "max": maximum,
+                "mean": total / count
+            }
+
+        return result
+
+    def format_summary(self):
+        summary = self.get_summary()
+        if len(summary) == 0:
+            return "No spans were recorded"
+
+        name_width = max(len(x) for x in summary)
+        lines = [f"{'span'.ljust(name_width)}  {'count':>8}  {'total (s)':>10}  {'mean (ms)':>10}  {'max (ms)':>10}"]
+        for name, stats in summary.items():
+            lines.append(f"{name.ljust(name_width)}  {stats['count']:>8}  {stats['total']:>10.3f}  "
+                         f"{stats['mean'] * 1000:>10.3f}  {stats['max'] * 1000:>10.3f}")
+
+        return "\n".join(lines)
+
+    # The recorded spans as a Chrome trace event file (complete events, times in microseconds)
+    def get_chrome_trace(self):
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+            dropped_events = self.dropped_events
+
+        result = dict()
+        result["traceEvents"] = [
+            {
+                "name": name,
+                "cat": name.split(".")[0],
+                "ph": "X",
+                "ts": (start_time - self.start_time) * 1e6,
+                "dur": duration * 1e6,
+                "pid": pid,
+                "tid": tid
+            } for name, start_time, duration, tid in events
+        ]
+        result["displayTimeUnit"] = "ms"
+        result["otherData"] = {
+            "summary": self.get_summary(),
+            "dropped_events": dropped_events
+        }
+
+        return result
+
+    def write_summary(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.get_summary(), f, indent=2)
+
+    def write_chrome_trace(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.get_chrome_trace(), f)
+
+
+# Span class
+#   Times the code in a with block (while tracing is on)
+class Span:
+    __slots__ = ("tracer", "name", "start_time")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add(self.name, self.start_time, time.perf_counter())
+        return False
+
+
+# Null span class
+#   What span() gives back while tracing is off
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name):
+    if tracer is None:
+        return NULL_SPAN
+
+    return Span(tracer, name)
+
+
+# Decorator version of span, times every call of the function
+def traced(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if tracer is None:
+                return function(*args, **kwargs)
+
+            with Span(tracer, name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def is_enabled():
+    return tracer is not None
+
+
+# Start tracing (from scratch), record_events keeps every span for a Chrome trace
+def enable(record_events=False):
+    global tracer
+    tracer = Tracer(record_events=record_events)
+
+    return tracer
+
+
+# Stop tracing, returns the tracer with everything recorded so far
+def disable():
+    global tracer
+    result = tracer
+    tracer = None
+
+    return result
+
+
+# Write out what was traced: a Chrome trace to trace_filename, a summary (JSON) to summary_filename,
+# and a summary table to stream
+def dump(trace_filename=None, summary_filename=None, stream=None):
+    if tracer is None:
+        return
+
+    if trace_filename is not None:
+        tracer.write_chrome_trace(trace_filename)
+    if summary_filename is not None:
+        tracer.write_summary(summary_filename)
+    if stream is not None:
+        stream.write(f"{tracer.format_summary()}\n")
+        stream.flush()
+
+
+# Turn tracing on if the environment variable asks for it, and write out the results on exit
+def enable_from_environment():
+    value = os.environ.get(ENVIRONMENT_VARIABLE, "").strip()
+    if value == "" or value == "0":
+        return
+
+    if value.lower().endswith(".json"):
+        enable(record_events=True)
+        atexit.register(dump, trace_filename=value, stream=sys.stderr)
+    else:
+        enable()
+        atexit.register(dump, stream=sys.stderr)
@@ -1,8 +1,10 @@
 import math
-from PyQt5.QtCore import QSize
-from PyQt5.QtWidgets import QAbstractButton, QSlider, QStyle
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtWidgets import QAbstractButton, QSlider, QStyle, QWidget
 from PyQt5.QtGui import QPainter
 
+from . import tracing
+
 
 # Custom image-based button
 #   Allows for very fancy custom buttons
@@ -93,3 +95,57 @@ class SeekBar(QSlider):
     def mouseMoveEvent(self, event):
         value = QStyle.sliderValueFromPosition(self.minimum(), self.maximum(), event.x(), self.width())
         self.set_position_if_set(value)
+
+
+# Frame viewer class
+#   Shows a frame scaled up to the viewer size. The (small) frame image is kept as it is
+#   and drawn scaled (nearest neighbour) when the viewer paints, with the flips done by the
+#   painter, so showing a frame doesn't copy, scale or convert the full size image
+class FrameViewer(QWidget):
+    def __init__(self,
+                 view_width,
+                 view_height,
+                 parent=None
+                 ):
+        super(FrameViewer, self).__init__(parent)
+        self.image = None
+        self.flip_v = False
+        self.flip_h = False
+        self.view_size = None
+
+        # We paint every pixel of the frame, so Qt doesn't need to clear the background first
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+
+        self.set_view_size(view_width, view_height)
+
+    def set_view_size(self, view_width, view_height):
+        self.view_size = QSize(view_width, view_height)
+        self.setFixedSize(self.view_size)
+        self.update()
+
+    def set_image(self, image, flip_v=False, flip_h=False):
+        self.image = image
+        self.flip_v = flip_v
+        self.flip_h = flip_h
+
+        self.update()
+
+    @tracing.traced("player.paint")
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        target = self.rect()
+
+        if self.image is None:
+            painter.fillRect(target, Qt.GlobalColor.black)
+            return
+
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, False)
+        if self.flip_v or self.flip_h:
+            # Mirror the whole viewer around its center
+            painter.translate(target.width() if self.flip_h else 0, target.height() if self.flip_v else 0)
+            painter.scale(-1 if self.flip_h else 1, -1 if self.flip_v else 1)
+
+        painter.drawImage(target, self.image)
+
+    def sizeHint(self):
+        return self.view_size
@@ -1,12 +1,18 @@
 import os
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QThreadPool
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QGridLayout, QHBoxLayout, QLabel,
     QFileDialog, QAction, QMessageBox, QSlider, QProgressDialog
 )
 from PyQt5.QtGui import QPixmap, QIcon
 
-from . import constants, generators, outputs, widgets, dialogs
+from . import constants, generators, outputs, renderers, widgets, workers
+
+
+# The dialogs are only imported when one is first opened, so they don't slow down startup
+def get_dialogs():
+    from . import dialogs
+    return dialogs
 
 
 # My QMainWindow class
@@ -27,10 +33,17 @@ class MyQMainWindow(QMainWindow):
         self.last_save_location = constants.USER_DIR
         self.last_load_location = constants.USER_DIR
 
-        self.renderer = outputs.Renderer(
+        self.renderer = renderers.Renderer(
             binary_waterfall=self.bw
         )
 
+        # Slow file and audio work happens here so the window stays responsive
+        self.thread_pool = QThreadPool.globalInstance()
+        self.worker = None
+        self.loading_popup = None
+        # The audio settings from before a change, until the new audio is ready
+        self.previous_audio_settings = None
+
         self.padding_px = 10
 
         self.seek_bar = widgets.SeekBar()
@@ -40,12 +53,12 @@ class MyQMainWindow(QMainWindow):
         self.update_seekbar()
         self.seek_bar.sliderMoved.connect(self.seekbar_moved)
 
-        self.player_label = QLabel()
-        self.player_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # The player sets the viewer size
+        self.player_viewer = widgets.FrameViewer(view_width=1, view_height=1)
 
         self.player = outputs.Player(
             binary_waterfall=self.bw,
-            display=self.player_label,
+            display=self.player_viewer,
             set_playbutton_function=self.set_play_button,
             set_seekbar_function=self.seek_bar.setValue
         )
@@ -166,7 +179,7 @@ class MyQMainWindow(QMainWindow):
         self.main_layout.setContentsMargins(0, 0, 0, self.padding_px)
         self.main_layout.setSpacing(self.padding_px)
 
-        self.main_layout.addWidget(self.player_label, 0, 0, 1, 5, alignment=Qt.AlignmentFlag.AlignCenter)
+        self.main_layout.addWidget(self.player_viewer, 0, 0, 1, 5, alignment=Qt.AlignmentFlag.AlignCenter)
         self.main_layout.addWidget(self.seek_bar, 1, 0, 1, 5, alignment=Qt.AlignmentFlag.AlignCenter)
         self.main_layout.addLayout(self.transport_left_layout, 2, 1,
                                    alignment=Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignRight)
@@ -269,6 +282,14 @@ class MyQMainWindow(QMainWindow):
         elif key == Qt.Key_Period:
             self.player.frame_forward()
 
+    def closeEvent(self, event):
+        # Stop any background work before the window goes away
+        self.cancel_worker()
+        self.thread_pool.waitForDone()
+        self.player.close()
+
+        super().closeEvent(event)
+
     def resize_window(self):
         # First, make largest elements smaller
         self.seek_bar.setFixedWidth(20)
@@ -397,20 +418,154 @@ class MyQMainWindow(QMainWindow):
         )
 
         if filename != "":
-            self.player.open_file(filename=filename)
-
-            file_path, file_title = os.path.split(filename)
-            file_savename, file_ext = os.path.splitext(file_title)
-            self.set_file_savename(file_savename)
-            self.setWindowTitle(f"{constants.TITLE} | {file_title}")
+            self.player.close_file()
+            self.update_seekbar()
+            self.export_menu.setEnabled(False)
+            self.file_menu_close.setEnabled(False)
 
-            self.last_load_location = filename
+            self.set_loading(True)
+            self.setWindowTitle(f"{constants.TITLE} | Opening...")
 
-            self.update_seekbar()
+            self.start_worker(
+                workers.Worker(self.bw.change_filename, filename),
+                finished_function=lambda result: self.file_mapped(filename),
+                failed_function=lambda message: self.loading_failed(
+                    f"An error occurred while opening the file: {message}"
+                )
+            )
 
+    # Menus that change the open file or its audio are locked while a worker is using them
+    def set_loading(self, loading):
+        self.file_menu_open.setEnabled(not loading)
+        self.settings_menu_audio.setEnabled(not loading)
+        self.settings_menu_video.setEnabled(not loading)
+        if loading:
+            self.export_menu.setEnabled(False)
+            self.file_menu_close.setEnabled(False)
+        elif self.bw.filename is not None:
             self.export_menu.setEnabled(True)
             self.file_menu_close.setEnabled(True)
 
+    def start_worker(self, worker, finished_function, failed_function, canceled_function=None):
+        self.worker = worker
+        worker.signals.finished.connect(finished_function)
+        worker.signals.failed.connect(failed_function)
+        if canceled_function is not None:
+            worker.signals.canceled.connect(canceled_function)
+        self.thread_pool.start(worker)
+
+    def cancel_worker(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    # The file is mapped, show it right away and get the audio ready in the background
+    def file_mapped(self, filename):
+        self.worker = None
+
+        file_path, file_title = os.path.split(filename)
+        file_savename, file_ext = os.path.splitext(file_title)
+        self.set_file_savename(file_savename)
+        self.setWindowTitle(f"{constants.TITLE} | {file_title}")
+
+        self.last_load_location = filename
+
+        self.update_seekbar()
+
+        self.player.show_file()
+
+        self.prepare_audio()
+
+    def prepare_audio(self):
+        if not self.player.needs_audio_file():
+            self.audio_ready()
+            return
+
+        self.loading_popup = QProgressDialog("Preparing audio...", "Abort", 0, 100, self)
+        self.loading_popup.setWindowFlags(self.windowFlags() ^ Qt.WindowContextHelpButtonHint)
+        self.loading_popup.setWindowTitle("Loading...")
+        self.loading_popup.setFixedSize(300, 100)
+        self.loading_popup.setValue(0)
+        self.loading_popup.canceled.connect(self.cancel_worker)
+
+        worker = workers.Worker(self.bw.get_audio_file, cancelable=True)
+        worker.signals.progress.connect(self.loading_popup.setValue)
+        self.start_worker(
+            worker,
+            finished_function=lambda result: self.audio_ready(),
+            failed_function=lambda message: self.loading_failed(
+                f"An error occurred while preparing the audio: {message}"
+            ),
+            canceled_function=self.audio_canceled
+        )
+
+    def close_loading_popup(self):
+        if self.loading_popup is not None:
+            self.loading_popup.canceled.disconnect(self.cancel_worker)
+            self.loading_popup.close()
+            self.loading_popup = None
+
+    def audio_ready(self):
+        self.worker = None
+        self.close_loading_popup()
+        self.previous_audio_settings = None
+
+        self.player.load_audio()
+        self.update_seekbar()
+
+        self.set_loading(False)
+
+    def audio_canceled(self):
+        self.worker = None
+        self.close_loading_popup()
+
+        if self.previous_audio_settings is not None:
+            # Only the new audio settings were canceled, go back to the old ones
+            self.restore_audio_settings()
+            return
+
+        # The file can't be played without its audio
+        self.set_loading(False)
+        self.close_file_clicked()
+
+    def loading_failed(self, message):
+        self.worker = None
+        self.close_loading_popup()
+
+        restore = self.previous_audio_settings is not None
+        if not restore:
+            self.set_loading(False)
+            self.close_file_clicked()
+
+        choice = QMessageBox.critical(
+            self,
+            "Error",
+            message,
+            QMessageBox.Ok
+        )
+
+        if restore:
+            # Only the new audio settings failed, keep the file open with the old ones
+            self.restore_audio_settings()
+
+    # Go back to the audio settings from before the last change, if that fails too the file is closed
+    def restore_audio_settings(self):
+        audio_settings = self.previous_audio_settings
+        self.previous_audio_settings = None
+
+        self.start_worker(
+            workers.Worker(
+                self.bw.set_audio_settings,
+                num_channels=audio_settings["num_channels"],
+                sample_bytes=audio_settings["sample_bytes"],
+                sample_rate=audio_settings["sample_rate"],
+                volume=audio_settings["volume"]
+            ),
+            finished_function=lambda result: self.audio_settings_changed(),
+            failed_function=lambda message: self.loading_failed(
+                f"An error occurred while restoring the audio settings: {message}"
+            )
+        )
+
     def close_file_clicked(self):
         self.pause_player()
 
@@ -425,6 +580,8 @@ class MyQMainWindow(QMainWindow):
         self.file_menu_close.setEnabled(False)
 
     def audio_settings_clicked(self):
+        dialogs = get_dialogs()
+
         popup = dialogs.AudioSettings(
             num_channels=self.bw.num_channels,
             sample_bytes=self.bw.sample_bytes,
@@ -437,16 +594,42 @@ class MyQMainWindow(QMainWindow):
 
         if result:
             audio_settings = popup.get_audio_settings()
-            self.player.set_audio_settings(
-                num_channels=audio_settings["num_channels"],
-                sample_bytes=audio_settings["sample_bytes"],
-                sample_rate=audio_settings["sample_rate"],
-                volume=audio_settings["volume"]
+
+            self.previous_audio_settings = dict()
+            self.previous_audio_settings["num_channels"] = self.bw.num_channels
+            self.previous_audio_settings["sample_bytes"] = self.bw.sample_bytes
+            self.previous_audio_settings["sample_rate"] = self.bw.sample_rate
+            self.previous_audio_settings["volume"] = self.bw.volume
+
+            # Let go of the audio file while it gets changed
+            self.pause_player()
+            self.player.set_audio_file(None)
+            self.set_loading(True)
+
+            self.start_worker(
+                workers.Worker(
+                    self.bw.set_audio_settings,
+                    num_channels=audio_settings["num_channels"],
+                    sample_bytes=audio_settings["sample_bytes"],
+                    sample_rate=audio_settings["sample_rate"],
+                    volume=audio_settings["volume"]
+                ),
+                finished_function=lambda result: self.audio_settings_changed(),
+                failed_function=lambda message: self.loading_failed(
+                    f"An error occurred while changing the audio settings: {message}"
+                )
             )
 
-            self.update_seekbar()
+    def audio_settings_changed(self):
+        self.worker = None
+
+        self.update_seekbar()
+
+        self.prepare_audio()
 
     def video_settings_clicked(self):
+        dialogs = get_dialogs()
+
         popup = dialogs.VideoSettings(
             bw=self.bw,
             width=self.bw.width,
@@ -463,6 +646,9 @@ class MyQMainWindow(QMainWindow):
 
         if result:
             video_settings = popup.get_video_settings()
+
+            # The prefetch thread renders from the settings, so it has to wait while they change
+            self.player.hold_frames()
             self.bw.set_dims(
                 width=video_settings["width"],
                 height=video_settings["height"]
@@ -480,10 +666,13 @@ class MyQMainWindow(QMainWindow):
             )
             self.player.refresh_dims()
             self.player.update_image()
+            self.player.release_frames()
             # We need to wait a moment for the size hint to be computed
             QTimer.singleShot(10, self.resize_window)
 
     def player_settings_clicked(self):
+        dialogs = get_dialogs()
+
         popup = dialogs.PlayerSettings(
             max_view_dim=self.player.max_dim,
             fps=self.player.fps,
@@ -500,6 +689,8 @@ class MyQMainWindow(QMainWindow):
             QTimer.singleShot(10, self.resize_window)
 
     def export_image_clicked(self):
+        dialogs = get_dialogs()
+
         if self.bw.audio_filename is None:
             choice = QMessageBox.critical(
                 self,
@@ -596,6 +787,8 @@ class MyQMainWindow(QMainWindow):
                 )
 
     def export_sequence_clicked(self):
+        dialogs = get_dialogs()
+
         if self.bw.audio_filename is None:
             choice = QMessageBox.critical(
                 self,
@@ -641,7 +834,8 @@ class MyQMainWindow(QMainWindow):
                         fps=settings["fps"],
                         keep_aspect=settings["keep_aspect"],
                         image_format=settings["format"],
-                        progress_dialog=progress_popup
+                        progress_dialog=progress_popup,
+                        workers=constants.DEFAULTS["export_workers"]
                     )
                 except Exception as e:
                     progress_popup.cancel()
@@ -669,6 +863,8 @@ class MyQMainWindow(QMainWindow):
                         )
 
     def export_video_clicked(self):
+        dialogs = get_dialogs()
+
         if self.bw.audio_filename is None:
             choice = QMessageBox.critical(
                 self,
@@ -734,7 +930,9 @@ class MyQMainWindow(QMainWindow):
                             audio_codec=encoder_settings["audio_codec"].value,
                             bitrate=None,
                             audio_bitrate=None,
-                            preset=encoder_settings["preset"].value
+                            preset=encoder_settings["preset"].value,
+                            segments=constants.DEFAULTS["video_segments"],
+                            segment_threads=constants.DEFAULTS["video_segment_threads"]
                         )
                     except Exception as e:
                         progress_popup.cancel()
@@ -761,11 +959,15 @@ class MyQMainWindow(QMainWindow):
                             )
 
     def hotkeys_clicked(self):
+        dialogs = get_dialogs()
+
         popup = dialogs.HotkeysInfo(parent=self)
 
         result = popup.exec()
 
     def about_clicked(self):
+        dialogs = get_dialogs()
+
         popup = dialogs.About(parent=self)
 
         result = popup.exec()
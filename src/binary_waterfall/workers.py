@@ -0,0 +1,51 @@
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+# Worker signals class
+#   Lets a Worker report back to the GUI thread (signals are queued across threads)
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    canceled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+
+# Background worker class
+#   Runs a slow function (like opening a file or computing audio) on a
+#   QThreadPool so the GUI doesn't freeze. If cancelable, the function is
+#   given progress_callback and cancel_event keyword arguments
+class Worker(QRunnable):
+    def __init__(self, function, *args, cancelable=False, **kwargs):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelable = cancelable
+
+        self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_canceled(self):
+        return self.cancel_event.is_set()
+
+    def run(self):
+        kwargs = dict(self.kwargs)
+        if self.cancelable:
+            kwargs["progress_callback"] = self.signals.progress.emit
+            kwargs["cancel_event"] = self.cancel_event
+
+        try:
+            result = self.function(*self.args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(str(e))
+        else:
+            if self.is_canceled():
+                self.signals.canceled.emit()
+            else:
+                self.signals.finished.emit(result)
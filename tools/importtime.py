@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Measure the GUI's cold-start cost and check it against a baseline
+#   The imports are timed with "python -X importtime" in a fresh interpreter, so nothing is cached
+#   in this process. Startup fails the check if it imports any of the baseline's forbidden modules
+#   (export-only dependencies that should load lazily) or takes longer than the baseline allows.
+#   Run from anywhere: python tools/importtime.py [--window] [--update]
+
+TOOLS_PATH = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(os.path.dirname(TOOLS_PATH), "src")
+BASELINE_FILE = os.path.join(TOOLS_PATH, "importtime_baseline.json")
+
+# Run in the child to time up to the first shown main window (offscreen, so no display is needed)
+WINDOW_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+from binary_waterfall import core
+from PyQt5.QtWidgets import QApplication
+main_window = core.MainWindow(sys.argv)
+main_window.window.show()
+QApplication.processEvents()
+print(json.dumps({"window_seconds": time.perf_counter() - start}))
+"""
+
+
+def get_environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([SOURCE_PATH] + [x for x in [env.get("PYTHONPATH")] if x])
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    return env
+
+
+# Parse the "import time: self [us] | cumulative | imported package" lines
+def parse_importtime(output):
+    result = dict()
+    result["modules"] = dict()
+    result["total_seconds"] = 0.0
+
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header line
+            continue
+
+        name = fields[2].rstrip()
+        cumulative = int(fields[1]) / 1e6
+        module = name.strip()
+        result["modules"][module] = cumulative
+
+        # Unindented names are imported from the top level, so their cumulative times add up to the total
+        if not name.startswith("  "):
+            result["total_seconds"] += cumulative
+
+    return result
+
+
+def measure_imports(module):
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=get_environment(),
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr}")
+
+    return parse_importtime(process.stderr)
+
+
+def measure_window():
+    process = subprocess.run(
+        [sys.executable, "-c", WINDOW_SCRIPT],
+        env=get_environment(),
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Showing the main window failed:\n{process.stderr}")
+
+    return json.loads(process.stdout.strip().splitlines()[-1])["window_seconds"]
+
+
+def get_forbidden_imports(modules, forbidden_modules):
+    result = list()
+    for module in sorted(modules):
+        for forbidden in forbidden_modules:
+            if module == forbidden or module.startswith(f"{forbidden}."):
+                result.append(module)
+                break
+
+    return result
+
+
+def get_slowest(modules, count):
+    return sorted(modules.items(), key=lambda x: x[1], reverse=True)[:count]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Check GUI startup import time against a baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file (default: %(default)s)")
+    parser.add_argument("--module", default=None, help="module to import (default: the baseline's)")
+    parser.add_argument("--window", action="store_true", help="also time showing the first main window")
+    parser.add_argument("--runs", type=int, default=3, help="measurements to take the best of (default: %(default)s)")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list (default: %(default)s)")
+    parser.add_argument("--update", action="store_true",
+                        help="write the measured times (with headroom) to the baseline instead of checking")
+    parser.add_argument("--headroom", type=float, default=1.5,
+                        help="factor the measured times are scaled by with --update (default: %(default)s)")
+
+    return parser
+
+
+def main(args):
+    args = get_parser().parse_args(args)
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+    module = args.module if args.module is not None else baseline["module"]
+
+    # Take the fastest run, the slower ones are mostly noise from the rest of the system
+    measurements = [measure_imports(module) for _ in range(max(args.runs, 1))]
+    imports = min(measurements, key=lambda x: x["total_seconds"])
+
+    print(f"import {module}: {imports['total_seconds']:.3f}s "
+          f"(budget {baseline['max_import_seconds']:.3f}s), {len(imports['modules'])} modules")
+    for name, seconds in get_slowest(imports["modules"], args.top):
+        print(f"  {seconds:8.3f}s  {name}")
+
+    window_seconds = None
+    if args.window:
+        window_seconds = min(measure_window() for _ in range(max(args.runs, 1)))
+        print(f"first window: {window_seconds:.3f}s (budget {baseline['max_window_seconds']:.3f}s)")
+
+    if args.update:
+        baseline["max_import_seconds"] = round(imports["total_seconds"] * args.headroom, 3)
+        if window_seconds is not None:
+            baseline["max_window_seconds"] = round(window_seconds * args.headroom, 3)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    problems = list()
+    for name in get_forbidden_imports(imports["modules"], baseline["forbidden_modules"]):
+        problems.append(f"{name} is imported at startup")
+    if imports["total_seconds"] > baseline["max_import_seconds"]:
+        problems.append(f"Imports took {imports['total_seconds']:.3f}s, "
+                        f"over the {baseline['max_import_seconds']:.3f}s budget")
+    if window_seconds is not None and window_seconds > baseline["max_window_seconds"]:
+        problems.append(f"The first window took {window_seconds:.3f}s, "
+                        f"over the {baseline['max_window_seconds']:.3f}s budget")
+
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+
+    return 1 if len(problems) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))